@@ -8,15 +8,22 @@ Provides a user-friendly interface for:
 """
 
 import os
+import asyncio
+import logging
+import threading
 import gradio as gr
 
+from metrics import start_metrics_server
 from rag_system import MedicalRAG
-from patient_manager import PatientManager
+
+# Per-request traces are logged as JSON lines on the "medical_rag" logger
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 # Initialize systems
 print("Initializing Medical RAG System...")
 rag = MedicalRAG()
-pm = PatientManager()
+# Share the RAG's manager so index rebuilds see new patients
+pm = rag.patient_manager
 
 # Setup RAG
 if not os.path.exists("./chroma_db"):
@@ -26,13 +33,20 @@ else:
     print("Loading existing vector store...")
     rag.setup_qa_chain()
 
-def answer_question(question: str, history: list) -> str:
+# Prometheus metrics for ask() at http://127.0.0.1:9100/metrics
+metrics_port = int(os.environ.get("METRICS_PORT", 9100))
+start_metrics_server(rag.metrics, port=metrics_port)
+print(f"Metrics available at http://127.0.0.1:{metrics_port}/metrics")
+
+def answer_question(question: str, history: list,
+                    cancel_event: threading.Event = None) -> str:
     """
     Handle question answering with enhanced output.
     
     Args:
         question: User's question
         history: Chat history (unused)
+        cancel_event: Stops generation when set
         
     Returns:
         Formatted answer with confidence and sources
@@ -41,7 +55,7 @@ def answer_question(question: str, history: list) -> str:
         return "Please ask a question."
     
     try:
-        result = rag.ask(question)
+        result = rag.ask(question, cancel_event=cancel_event)
         answer = result['answer']
         
         # Add confidence indicator
@@ -82,14 +96,25 @@ with gr.Blocks(title="Medical RAG Assistant") as demo:
                 label="Ask a question",
                 placeholder="Type your question here..."
             )
-            clear = gr.Button("Clear")
+            with gr.Row():
+                stop = gr.Button("Stop")
+                clear = gr.Button("Clear")
             
-            def respond(message, chat_history):
-                bot_message = answer_question(message, chat_history)
+            async def respond(message, chat_history):
+                # Gradio cancels this task on Stop or when the client goes away;
+                # the event then ends generation in the worker thread too
+                cancel_event = threading.Event()
+                try:
+                    bot_message = await asyncio.to_thread(
+                        answer_question, message, chat_history, cancel_event
+                    )
+                finally:
+                    cancel_event.set()
                 chat_history.append((message, bot_message))
                 return "", chat_history
             
-            msg.submit(respond, [msg, chatbot], [msg, chatbot])
+            submit_event = msg.submit(respond, [msg, chatbot], [msg, chatbot])
+            stop.click(None, None, None, cancels=[submit_event])
             clear.click(lambda: None, None, chatbot, queue=False)
         
         with gr.Tab("➕ Add Patient"):
@@ -140,11 +165,12 @@ with gr.Blocks(title="Medical RAG Assistant") as demo:
                         
                         pm.add_measurements(pid, measurements)
                         
-                        # Rebuild vector store
-                        rag.create_vectorstore()
-                        rag.setup_qa_chain()
+                        # Rebuild vector store in the background; chat keeps using the current one
+                        rag.rebuild_index_async()
                         
-                        return f"✓ Patient {pid} added successfully!\n\n{pm.get_patient_summary(pid)}"
+                        return (f"✓ Patient {pid} added successfully! "
+                                f"Searchable once the background index rebuild finishes.\n\n"
+                                f"{pm.get_patient_summary(pid)}")
                     else:
                         return f"✗ Patient {pid} already exists!"
                 except Exception as e:
@@ -158,21 +184,46 @@ with gr.Blocks(title="Medical RAG Assistant") as demo:
         
         with gr.Tab("📋 View Patients"):
             gr.Markdown("### All Patients")
-            refresh_btn = gr.Button("Refresh List")
+            
+            with gr.Row():
+                search = gr.Textbox(label="Search", placeholder="Patient ID or name")
+                page = gr.Number(label="Page", value=1, precision=0, minimum=1)
+            
+            with gr.Row():
+                prev_btn = gr.Button("◀ Previous")
+                refresh_btn = gr.Button("Refresh List")
+                next_btn = gr.Button("Next ▶")
+            
+            page_info = gr.Markdown()
             patient_list = gr.Textbox(label="Patients", lines=20)
             
-            def show_patients():
-                patients = pm.get_all_patients()
-                if not patients:
-                    return "No patients found."
+            PAGE_SIZE = 20
+            
+            def show_patients(query, page_num):
+                summaries, total = pm.search_patients(query or "", int(page_num or 1), PAGE_SIZE)
+                pages = max(1, -(-total // PAGE_SIZE))
+                page_num = min(max(int(page_num or 1), 1), pages)
+                if total and not summaries:
+                    # Page past the end after the filter shrank the results
+                    summaries, total = pm.search_patients(query or "", page_num, PAGE_SIZE)
+                
+                if not total:
+                    return "No patients found.", 1, ""
                 
                 output = ""
-                for pid in patients:
-                    output += pm.get_patient_summary(pid) + "\n" + "="*60 + "\n\n"
-                return output
+                for summary in summaries:
+                    output += summary + "\n" + "="*60 + "\n\n"
+                return output, page_num, f"Page {page_num} of {pages} ({total} patients)"
+            
+            view_inputs = [search, page]
+            view_outputs = [patient_list, page, page_info]
             
-            refresh_btn.click(show_patients, None, patient_list)
-            demo.load(show_patients, None, patient_list)
+            search.submit(lambda q: show_patients(q, 1), search, view_outputs)
+            page.submit(show_patients, view_inputs, view_outputs)
+            prev_btn.click(lambda q, p: show_patients(q, (p or 1) - 1), view_inputs, view_outputs)
+            next_btn.click(lambda q, p: show_patients(q, (p or 1) + 1), view_inputs, view_outputs)
+            refresh_btn.click(show_patients, view_inputs, view_outputs)
+            demo.load(show_patients, view_inputs, view_outputs)
 
 if __name__ == "__main__":
     demo.launch(share=False)
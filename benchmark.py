@@ -0,0 +1,435 @@
+"""
+End-to-End Benchmark for Medical RAG System
+
+Generates a synthetic PubMed-style corpus and patient population, then
+measures:
+- Index build time
+- Cold startup (fresh process) and warm startup (same process)
+- ask() latency percentiles and throughput under concurrency
+- Peak memory (RSS)
+
+Runs offline with deterministic stub models by default; pass
+--real-models to benchmark MiniLM + TinyLlama instead.
+Results are written as JSON for comparison across commits.
+
+Usage:
+    python3 benchmark.py --articles 500 --patients 200
+    python3 benchmark.py --compare benchmark_results/<baseline>.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any
+
+from corpus_store import CorpusStore
+from patient_manager import PatientManager
+from rag_system import MedicalRAG
+from stub_models import HashingEmbeddings, StubLLM
+
+CONDITIONS = [
+    "diabetes mellitus", "hypertension", "asthma", "heart failure",
+    "chronic kidney disease", "pneumonia", "migraine", "osteoporosis",
+    "atrial fibrillation", "hypothyroidism", "anemia", "sepsis"
+]
+INTERVENTIONS = [
+    "metformin", "lifestyle modification", "ACE inhibitors", "inhaled corticosteroids",
+    "beta blockers", "statin therapy", "early mobilization", "dietary sodium restriction",
+    "anticoagulation", "vitamin D supplementation", "telemonitoring", "exercise training"
+]
+OUTCOMES = [
+    "mortality", "hospital readmission", "quality of life", "blood pressure control",
+    "glycemic control", "symptom burden", "renal function", "adverse events"
+]
+STUDY_TYPES = [
+    "a randomized controlled trial", "a prospective cohort study",
+    "a systematic review and meta-analysis", "a retrospective analysis"
+]
+FIRST_NAMES = ["John", "Jane", "Robert", "Maria", "David", "Aisha", "Wei", "Priya", "Carlos", "Emma"]
+LAST_NAMES = ["Doe", "Smith", "Johnson", "Garcia", "Chen", "Patel", "Okafor", "Kim", "Muller", "Rossi"]
+
+def generate_articles(count: int, rng: random.Random) -> List[Dict[str, str]]:
+    """
+    Generate synthetic PubMed-style articles.
+    
+    Args:
+        count: Number of articles
+        rng: Random number generator
+        
+    Returns:
+        List of article dictionaries in the CorpusStore format
+    """
+    articles = []
+    for i in range(count):
+        pmid = str(30000000 + i)
+        condition = rng.choice(CONDITIONS)
+        intervention = rng.choice(INTERVENTIONS)
+        outcome = rng.choice(OUTCOMES)
+        study = rng.choice(STUDY_TYPES)
+        n = rng.randint(40, 5000)
+        effect = rng.randint(5, 45)
+        
+        abstract = (
+            f"BACKGROUND: {condition.capitalize()} is a leading cause of morbidity, "
+            f"and the effect of {intervention} on {outcome} remains uncertain.\n"
+            f"METHODS: We conducted {study} of {n} adults with {condition}, "
+            f"comparing {intervention} with usual care over {rng.randint(3, 36)} months.\n"
+            f"RESULTS: {intervention.capitalize()} was associated with a {effect}% "
+            f"relative improvement in {outcome} "
+            f"(95% CI {max(1, effect - 8)}-{effect + 8}%). "
+            f"Secondary outcomes included {rng.choice(OUTCOMES)} and {rng.choice(OUTCOMES)}.\n"
+            f"CONCLUSIONS: In patients with {condition}, {intervention} improves {outcome} "
+            f"and should be considered in routine care."
+        )
+        articles.append({
+            'pmid': pmid,
+            'title': f"{intervention.capitalize()} and {outcome} in {condition}: {study}",
+            'abstract': abstract,
+            'source': f"PubMed ID: {pmid}",
+            'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+            'topic': condition
+        })
+    return articles
+
+def generate_patients(count: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Generate a synthetic patient population.
+    
+    Args:
+        count: Number of patients
+        rng: Random number generator
+        
+    Returns:
+        Dictionary of patient records in the PatientManager format
+    """
+    patients = {}
+    for i in range(count):
+        measurements = []
+        for visit in range(rng.randint(1, 4)):
+            measurements.append({
+                "timestamp": datetime(2024, 1 + visit * 3, rng.randint(1, 28)).isoformat(),
+                "data": {
+                    "Blood Pressure": f"{rng.randint(100, 175)}/{rng.randint(60, 105)} mmHg",
+                    "Heart Rate": f"{rng.randint(55, 110)} bpm",
+                    "Blood Sugar (Fasting)": f"{rng.randint(70, 240)} mg/dL",
+                    "Weight": f"{rng.randint(45, 120)} kg",
+                    "BMI": f"{rng.uniform(18, 36):.1f}",
+                    "Oxygen Saturation": f"{rng.randint(90, 100)}%"
+                }
+            })
+        patients[f"P{i + 1:05d}"] = {
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "age": rng.randint(18, 90),
+            "gender": rng.choice(["Male", "Female"]),
+            "measurements": measurements,
+            "created_at": datetime(2024, 1, 1).isoformat()
+        }
+    return patients
+
+def generate_questions(count: int, patients: Dict[str, Any], rng: random.Random) -> List[str]:
+    """
+    Generate a mix of medical knowledge and patient questions.
+    
+    Args:
+        count: Number of questions
+        patients: Patient records to ask about
+        rng: Random number generator
+        
+    Returns:
+        List of questions
+    """
+    questions = []
+    patient_ids = list(patients)
+    for _ in range(count):
+        if patient_ids and rng.random() < 0.4:
+            pid = rng.choice(patient_ids)
+            questions.append(rng.choice([
+                f"What is {patients[pid]['name']}'s blood pressure?",
+                f"What is the BMI of patient {pid}?",
+                f"Does patient {pid} have high blood sugar?"
+            ]))
+        else:
+            questions.append(rng.choice([
+                f"What is {rng.choice(CONDITIONS)}?",
+                f"Does {rng.choice(INTERVENTIONS)} improve {rng.choice(OUTCOMES)}?",
+                f"What are the treatments for {rng.choice(CONDITIONS)}?"
+            ]))
+    return questions
+
+def create_workspace(workdir: str, articles: int, patients: int, seed: int) -> Dict[str, Any]:
+    """
+    Write a synthetic corpus and patient population to a directory.
+    
+    Args:
+        workdir: Target directory
+        articles: Number of articles
+        patients: Number of patients
+        seed: Random seed
+        
+    Returns:
+        The generated patient records
+    """
+    rng = random.Random(seed)
+    CorpusStore(os.path.join(workdir, "medical_data")).append_articles(
+        generate_articles(articles, rng)
+    )
+    
+    patient_dir = os.path.join(workdir, "patient_data")
+    os.makedirs(patient_dir, exist_ok=True)
+    records = generate_patients(patients, rng)
+    with open(os.path.join(patient_dir, "patients.json"), 'w') as f:
+        json.dump(records, f)
+    return records
+
+def build_rag(workdir: str, index_name: str, real_models: bool, llm_latency: float) -> MedicalRAG:
+    """
+    Create a MedicalRAG over a workspace, without building the index.
+    
+    Args:
+        workdir: Workspace directory
+        index_name: Vector store directory name within the workspace
+        real_models: Use MiniLM + TinyLlama instead of stub models
+        llm_latency: Stub LLM delay per call in seconds
+        
+    Returns:
+        MedicalRAG instance
+    """
+    return MedicalRAG(
+        data_dir=os.path.join(workdir, "medical_data"),
+        persist_directory=os.path.join(workdir, index_name),
+        embeddings=None if real_models else HashingEmbeddings(),
+        llm=None if real_models else StubLLM(latency=llm_latency),
+        patient_manager=PatientManager(os.path.join(workdir, "patient_data"))
+    )
+
+def time_startup(workdir: str, index_name: str, real_models: bool, llm_latency: float) -> float:
+    """
+    Time creating a MedicalRAG and making it ready to answer.
+    
+    Args:
+        workdir: Workspace directory
+        index_name: Vector store directory name (must not exist yet)
+        real_models: Use MiniLM + TinyLlama instead of stub models
+        llm_latency: Stub LLM delay per call in seconds
+        
+    Returns:
+        Startup time in seconds
+    """
+    start = time.perf_counter()
+    rag = build_rag(workdir, index_name, real_models, llm_latency)
+    rag.setup_qa_chain()
+    return time.perf_counter() - start
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples.
+    
+    Args:
+        samples: Latencies in seconds
+        
+    Returns:
+        Dictionary of p50/p95/p99/mean/max in milliseconds
+    """
+    ordered = sorted(samples)
+    
+    def rank(p: float) -> float:
+        # Nearest-rank percentile
+        return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+    
+    return {
+        "p50": rank(0.50) * 1000,
+        "p95": rank(0.95) * 1000,
+        "p99": rank(0.99) * 1000,
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "max": ordered[-1] * 1000
+    }
+
+def peak_rss_mb() -> float:
+    """Get the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def git_commit() -> str:
+    """Get the current git commit, or 'unknown' outside a repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the full benchmark.
+    
+    Args:
+        args: Parsed command line arguments
+        
+    Returns:
+        Results dictionary with config and metrics
+    """
+    workdir = tempfile.mkdtemp(prefix="medical-rag-bench-")
+    try:
+        print(f"Generating {args.articles} articles and {args.patients} patients...")
+        patients = create_workspace(workdir, args.articles, args.patients, args.seed)
+        questions = generate_questions(args.questions, patients, random.Random(args.seed + 1))
+        metrics = {}
+        
+        # Cold startup: wall time of a new interpreter, so imports and model loading count
+        print("Measuring cold startup...")
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--startup-probe", workdir,
+             "--llm-latency", str(args.llm_latency)]
+            + (["--real-models"] if args.real_models else []),
+            capture_output=True, text=True, check=True
+        )
+        metrics["cold_startup_s"] = time.perf_counter() - start
+        
+        print("Building index...")
+        rag = build_rag(workdir, "chroma_build", args.real_models, args.llm_latency)
+        start = time.perf_counter()
+        rag.create_vectorstore()
+        metrics["index_build_s"] = time.perf_counter() - start
+        metrics["index_chunks"] = rag.vectorstore._collection.count()
+        rag.setup_qa_chain()
+        
+        print("Measuring warm startup...")
+        metrics["warm_startup_s"] = time_startup(workdir, "chroma_warm", args.real_models,
+                                                 args.llm_latency)
+        
+        print(f"Asking {len(questions)} questions sequentially...")
+        rag.ask(questions[0])  # Warm-up, not counted
+        latencies = []
+        abstained = 0
+        for question in questions:
+            start = time.perf_counter()
+            result = rag.ask(question)
+            latencies.append(time.perf_counter() - start)
+            abstained += not result["sources"]
+        metrics["ask_latency_ms"] = percentiles(latencies)
+        # Abstentions skip generation, so a shift here changes latency too
+        metrics["abstention_rate"] = abstained / len(questions)
+        
+        print(f"Asking {len(questions)} questions with concurrency {args.concurrency}...")
+        
+        def timed_ask(question: str) -> float:
+            start = time.perf_counter()
+            rag.ask(question)
+            return time.perf_counter() - start
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            concurrent_latencies = list(pool.map(timed_ask, questions))
+        elapsed = time.perf_counter() - start
+        metrics["concurrent_throughput_qps"] = len(questions) / elapsed
+        metrics["concurrent_latency_ms"] = percentiles(concurrent_latencies)
+        
+        metrics["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "articles": args.articles,
+            "patients": args.patients,
+            "questions": args.questions,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "real_models": args.real_models,
+            "llm_latency": args.llm_latency,
+            "python": sys.version.split()[0],
+            "platform": sys.platform
+        },
+        "metrics": metrics
+    }
+
+def flatten(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested metrics into dotted names."""
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+def print_results(results: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    """
+    Print metrics, with changes relative to a baseline if given.
+    
+    Args:
+        results: Results of this run
+        baseline: Results of an earlier run
+    """
+    current = flatten(results["metrics"])
+    previous = flatten(baseline["metrics"]) if baseline else {}
+    
+    print("\n" + "=" * 60)
+    header = f"Results @ {results['git_commit']}"
+    if baseline:
+        header += f" vs {baseline['git_commit']}"
+    print(header)
+    print("=" * 60)
+    for name, value in current.items():
+        line = f"{name:<32} {value:>12.2f}"
+        if name in previous and previous[name]:
+            change = (value - previous[name]) / previous[name] * 100
+            line += f"   {previous[name]:>12.2f}  ({change:+.1f}%)"
+        print(line)
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the Medical RAG system")
+    parser.add_argument("--articles", type=int, default=500, help="Synthetic articles")
+    parser.add_argument("--patients", type=int, default=200, help="Synthetic patients")
+    parser.add_argument("--questions", type=int, default=100, help="Questions per latency run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent askers")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--real-models", action="store_true",
+                        help="Use MiniLM + TinyLlama instead of stub models")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Stub LLM delay per call in seconds")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--startup-probe", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.startup_probe:
+        time_startup(args.startup_probe, "chroma_cold", args.real_models, args.llm_latency)
+        return
+    
+    results = run_benchmark(args)
+    
+    output = args.output or os.path.join(
+        "benchmark_results",
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"\nSaved results to {output}")
+
+if __name__ == "__main__":
+    main()
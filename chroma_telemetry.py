@@ -0,0 +1,22 @@
+"""
+Chroma Telemetry
+
+Telemetry client plugged into Chroma through its
+chroma_product_telemetry_impl setting.
+"""
+
+from chromadb.telemetry.product import ProductTelemetryClient, ProductTelemetryEvent
+from overrides import override
+
+class NoTelemetry(ProductTelemetryClient):
+    """
+    Chroma telemetry client that sends nothing.
+    
+    Keeps the system fully local, and replaces Chroma's default client,
+    whose event batching is not thread-safe and can raise KeyError from
+    concurrent queries.
+    """
+    
+    @override
+    def capture(self, event: ProductTelemetryEvent) -> None:
+        pass
@@ -0,0 +1,230 @@
+"""
+Corpus Store
+
+Persistent, append-only storage for collected PubMed articles.
+Tracks which PMIDs have been seen and when each topic was last fetched,
+so collection runs can resume and fetch only new articles.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+class CorpusStore:
+    """
+    Append-only article store with collection state.
+    
+    Files (all in data_dir):
+    - pubmed_articles.jsonl: one article per line, never rewritten
+    - pending_changes.jsonl: articles added since the index last consumed them
+    - collector_state.json: per-topic last-fetch dates
+    
+    The set of seen PMIDs is rebuilt from the article store on load,
+    so it can never drift out of sync with what was actually saved.
+    
+    The collector and MedicalRAG open the same files from different
+    processes. Appends and clears hold an exclusive lock on
+    .corpus_store.lock, as do full index builds while they read. Other
+    readers take no lock and skip an incomplete last line, which is an
+    append still in flight.
+    """
+    
+    def __init__(self, data_dir: str = "medical_data"):
+        """
+        Initialize corpus store.
+        
+        Args:
+            data_dir: Directory containing the store files
+        """
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.articles_file = os.path.join(data_dir, "pubmed_articles.jsonl")
+        self.changes_file = os.path.join(data_dir, "pending_changes.jsonl")
+        self.state_file = os.path.join(data_dir, "collector_state.json")
+        self.lock_file = os.path.join(data_dir, ".corpus_store.lock")
+        
+        self._changes_read = 0
+        self.state = self.load_state()
+        self.seen_pmids = {article['pmid'] for article in self.iter_articles()}
+    
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Hold the store's cross-process write lock (not re-entrant).
+        
+        Readers can hold it to see the article store and the pending
+        changes at the same point, with no append half done.
+        """
+        with open(self.lock_file, 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    
+    @staticmethod
+    def _repair(path: str) -> None:
+        """
+        Drop a partially written last line left by an interrupted append.
+        
+        Only safe under the write lock, when no append can be in flight.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+    
+    @staticmethod
+    def _read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+        """Yield records from a JSONL file, if it exists, up to its last complete line."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # No newline: an append in flight, or one a crash cut short
+                if not line.endswith('\n'):
+                    return
+                if line.strip():
+                    yield json.loads(line)
+    
+    @staticmethod
+    def _append_jsonl(path: str, records: List[Dict[str, Any]]) -> None:
+        """Append records to a JSONL file and flush them to disk."""
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def exists(self) -> bool:
+        """Return True if any articles have been stored."""
+        return os.path.exists(self.articles_file)
+    
+    def load_state(self) -> Dict[str, Any]:
+        """
+        Load collection state from JSON file.
+        
+        Returns:
+            State dictionary with per-topic last-fetch dates
+        """
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        return {"topics": {}}
+    
+    def save_state(self) -> None:
+        """Save collection state atomically."""
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_file, self.state_file)
+    
+    def get_last_fetch(self, topic: str) -> Optional[str]:
+        """
+        Get the date a topic was last fetched.
+        
+        Args:
+            topic: Search query
+            
+        Returns:
+            Date as YYYY/MM/DD, or None if never fetched
+        """
+        return self.state["topics"].get(topic, {}).get("last_fetch")
+    
+    def set_last_fetch(self, topic: str, fetch_date: str) -> None:
+        """
+        Record that a topic was fetched up to the given date.
+        
+        Args:
+            topic: Search query
+            fetch_date: Date as YYYY/MM/DD
+        """
+        self.state["topics"].setdefault(topic, {})["last_fetch"] = fetch_date
+        self.save_state()
+    
+    def append_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Append unseen articles to the store and the pending changes.
+        
+        Args:
+            articles: Article dictionaries with a 'pmid' key
+            
+        Returns:
+            The articles that were actually added
+        """
+        added = []
+        for article in articles:
+            if article['pmid'] not in self.seen_pmids:
+                self.seen_pmids.add(article['pmid'])
+                added.append(article)
+        
+        if added:
+            with self.locked():
+                self._repair(self.changes_file)
+                self._repair(self.articles_file)
+                # Changes first: a crash in between re-fetches the articles on
+                # the next run instead of storing them without telling the index
+                self._append_jsonl(self.changes_file, added)
+                self._append_jsonl(self.articles_file, added)
+        return added
+    
+    def iter_articles(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all stored articles.
+        
+        Returns:
+            Iterator of article dictionaries
+        """
+        return self._read_jsonl(self.articles_file)
+    
+    def read_changes(self) -> List[Dict[str, Any]]:
+        """
+        Get articles added since the changes were last cleared.
+        
+        Returns:
+            List of article dictionaries, without duplicate PMIDs
+        """
+        changes = {}
+        self._changes_read = 0
+        if os.path.exists(self.changes_file):
+            with open(self.changes_file, 'rb') as f:
+                data = f.read()
+            # Only consume complete lines; a concurrent append may be in flight
+            self._changes_read = data.rfind(b'\n') + 1
+            for line in data[:self._changes_read].decode('utf-8').splitlines():
+                if line.strip():
+                    article = json.loads(line)
+                    changes.setdefault(article['pmid'], article)
+        return list(changes.values())
+    
+    def clear_changes(self) -> None:
+        """
+        Mark the changes returned by the last read_changes() as consumed.
+        
+        Changes appended after that read are kept for the next one.
+        """
+        # Locked so no append can land between reading the rest and replacing the file
+        with self.locked():
+            if not os.path.exists(self.changes_file):
+                return
+            with open(self.changes_file, 'rb') as f:
+                f.seek(self._changes_read)
+                remainder = f.read()
+            if remainder:
+                tmp_file = self.changes_file + ".tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(remainder)
+                os.replace(tmp_file, self.changes_file)
+            else:
+                os.remove(self.changes_file)
+            self._changes_read = 0
@@ -6,13 +6,78 @@ Fetches medical articles and information from public sources:
 - MedlinePlus (health topics)
 """
 
+import asyncio
 import json
 import os
-from typing import List, Dict, Any
+import re
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Mapping, Tuple
+from urllib.parse import urljoin, urlparse
 
-import requests
+import aiohttp
 from bs4 import BeautifulSoup
 
+from corpus_store import CorpusStore
+from http_cache import HTTPCache
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+MEDLINEPLUS_INDEX_URL = "https://medlineplus.gov/healthtopics.html"
+
+# NLM asks crawlers to stay under 85 requests per minute
+MEDLINEPLUS_REQUESTS_PER_SECOND = 85 / 60
+
+# Topic pages (/diabetes.html) and alphabetical index pages (/healthtopics_d.html)
+TOPIC_PAGE_PATTERN = re.compile(r"^/[a-z0-9]+\.html$")
+INDEX_PAGE_PATTERN = re.compile(r"^/healthtopics(_[a-z0-9]+)?\.html$")
+
+# Statuses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# PMIDs per esearch request when paging through a topic's date window
+ESEARCH_PAGE_SIZE = 500
+
+# Common medical topics
+DEFAULT_TOPICS = [
+    "anatomy basics",
+    "cardiovascular system",
+    "respiratory system",
+    "digestive system",
+    "nervous system",
+    "diabetes mellitus",
+    "hypertension",
+    "infectious diseases"
+]
+
+class RateLimiter:
+    """
+    Spaces out requests so that at most `rate` start per second.
+    
+    Shared by every concurrent task of a collection run, so the limit
+    applies to the whole run rather than to each topic.
+    """
+    
+    def __init__(self, rate: float):
+        """
+        Initialize rate limiter.
+        
+        Args:
+            rate: Maximum requests per second
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Wait until the next request slot is available."""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
 class MedicalDataCollector:
     """
     Collects medical data from public APIs and websites.
@@ -20,74 +85,454 @@ class MedicalDataCollector:
     Sources:
     - PubMed Central (via E-utilities API)
     - MedlinePlus (via web scraping)
+    
+    MedlinePlus pages are crawled by a bounded worker pool through an
+    on-disk HTTP cache, so re-crawls only download changed pages.
+    
+    PubMed requests are made asynchronously over a pooled connection,
+    with article IDs batched into single efetch calls, a shared
+    requests-per-second limit, and retries with exponential backoff.
+    
+    Collection is incremental: articles are checkpointed to a CorpusStore
+    after each topic, already-seen PMIDs are skipped, and each topic is
+    only searched for articles added since its last fetch.
     """
     
-    def __init__(self):
-        """Initialize data collector."""
-        self.data_dir = "medical_data"
+    def __init__(self, data_dir: str = "medical_data",
+                 base_url: str = EUTILS_BASE_URL,
+                 requests_per_second: Optional[float] = None,
+                 max_connections: int = 4,
+                 batch_size: int = 200,
+                 max_retries: int = 3,
+                 backoff: float = 0.5,
+                 timeout: float = 30.0,
+                 api_key: Optional[str] = None,
+                 medlineplus_url: str = MEDLINEPLUS_INDEX_URL,
+                 medlineplus_requests_per_second: float = MEDLINEPLUS_REQUESTS_PER_SECOND):
+        """
+        Initialize data collector.
+        
+        Args:
+            data_dir: Directory for collected data
+            base_url: E-utilities base URL (point at a local stub for testing)
+            requests_per_second: Request rate limit; defaults to NCBI's
+                limit of 3/s, or 10/s when an API key is set
+            max_connections: Size of the HTTP connection pool
+            batch_size: Maximum PMIDs per efetch call
+            max_retries: Retries per request after the first attempt
+            backoff: Initial retry delay in seconds, doubled per attempt
+            timeout: Total timeout per request in seconds
+            api_key: NCBI API key (defaults to $NCBI_API_KEY)
+            medlineplus_url: MedlinePlus health topics index page
+            medlineplus_requests_per_second: Request rate limit for MedlinePlus
+        """
+        self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
+        self.store = CorpusStore(self.data_dir)
+        self.http_cache = HTTPCache(os.path.join(self.data_dir, "http_cache"))
+        
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.api_key = api_key or os.environ.get("NCBI_API_KEY")
+        if requests_per_second is None:
+            requests_per_second = 10.0 if self.api_key else 3.0
+        self.requests_per_second = requests_per_second
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.medlineplus_url = medlineplus_url
+        self.medlineplus_requests_per_second = medlineplus_requests_per_second
     
-    def fetch_pubmed_articles(self, query: str, max_results: int = 50) -> List[Dict[str, str]]:
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Create an HTTP session with a bounded, reusable connection pool."""
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+    
+    async def _get(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                   url: str, params: Optional[Dict[str, Any]] = None,
+                   headers: Optional[Dict[str, str]] = None) -> Tuple[int, Mapping[str, str], str]:
         """
-        Fetch articles from PubMed Central using E-utilities API.
+        Make a rate-limited GET request, retrying transient failures.
         
         Args:
-            query: Search query
-            max_results: Maximum number of articles to fetch
+            session: Shared HTTP session
+            limiter: Shared rate limiter
+            url: Request URL
+            params: Query parameters
+            headers: Request headers
             
         Returns:
-            List of article dictionaries
+            Tuple of (status, response headers, body text)
         """
-        base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            delay = self.backoff * (2 ** attempt)
+            try:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return response.status, response.headers, await response.text()
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+                    error = aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message=response.reason or ""
+                    )
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            
+            if attempt == self.max_retries:
+                raise error
+            await asyncio.sleep(delay)
+    
+    async def _request(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                       endpoint: str, params: Dict[str, Any]) -> str:
+        """
+        Make an E-utilities request against the PubMed database.
         
-        # Search for articles
-        search_url = f"{base_url}esearch.fcgi?db=pubmed&term={query}&retmax={max_results}&retmode=json"
-        response = requests.get(search_url)
-        data = response.json()
+        Args:
+            session: Shared HTTP session
+            limiter: Shared rate limiter
+            endpoint: E-utility name, e.g. "esearch.fcgi"
+            params: Query parameters
+            
+        Returns:
+            Response body text
+        """
+        params = dict(params, db="pubmed")
+        if self.api_key:
+            params["api_key"] = self.api_key
+        _, _, body = await self._get(session, limiter, self.base_url + endpoint, params)
+        return body
+    
+    async def _search_ids(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                          query: str, max_results: int,
+                          mindate: Optional[str] = None,
+                          maxdate: Optional[str] = None,
+                          retstart: int = 0) -> Tuple[List[str], int]:
+        """
+        Search PubMed and return one page of matching PMIDs.
         
-        if 'esearchresult' not in data or 'idlist' not in data['esearchresult']:
-            return []
+        Args:
+            session: Shared HTTP session
+            limiter: Shared rate limiter
+            query: Search query
+            max_results: Maximum number of PMIDs
+            mindate: Only articles added to PubMed on or after this YYYY/MM/DD
+            maxdate: Only articles added to PubMed on or before this YYYY/MM/DD
+            retstart: Index of the first result to return
+            
+        Returns:
+            Tuple of (PMIDs, total number of matching articles)
+        """
+        params = {
+            "term": query,
+            "retmax": max_results,
+            "retstart": retstart,
+            "retmode": "json"
+        }
+        if mindate:
+            params.update(datetype="edat", mindate=mindate, maxdate=maxdate or mindate)
+        body = await self._request(session, limiter, "esearch.fcgi", params)
+        result = json.loads(body).get('esearchresult', {})
+        ids = result.get('idlist', [])
+        return ids, int(result.get('count', len(ids)))
+    
+    async def _fetch_articles(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                              ids: List[str]) -> List[Dict[str, str]]:
+        """
+        Fetch titles and abstracts for PMIDs, batch_size IDs per efetch call.
         
-        ids = data['esearchresult']['idlist']
+        Args:
+            session: Shared HTTP session
+            limiter: Shared rate limiter
+            ids: PMIDs to fetch
+            
+        Returns:
+            List of article dictionaries, in the order of `ids`
+        """
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        bodies = await asyncio.gather(*[
+            self._request(session, limiter, "efetch.fcgi", {
+                "id": ",".join(batch),
+                "rettype": "abstract",
+                "retmode": "xml"
+            })
+            for batch in batches
+        ])
+        
+        parsed = {}
+        for body in bodies:
+            for article in self._parse_efetch(body):
+                parsed[article['pmid']] = article
         
-        # Fetch summaries
         articles = []
         for pmid in ids:
-            summary_url = f"{base_url}esummary.fcgi?db=pubmed&id={pmid}&retmode=json"
-            summary_response = requests.get(summary_url)
-            summary_data = summary_response.json()
-            
-            if 'result' in summary_data and pmid in summary_data['result']:
-                article = summary_data['result'][pmid]
+            if pmid in parsed:
+                article = parsed[pmid]
                 articles.append({
-                    'title': article.get('title', ''),
-                    'abstract': article.get('abstract', ''),
+                    'pmid': pmid,
+                    'title': article['title'],
+                    'abstract': article['abstract'],
                     'source': f"PubMed ID: {pmid}",
                     'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
                 })
+        return articles
+    
+    @staticmethod
+    def _parse_efetch(body: str) -> List[Dict[str, str]]:
+        """
+        Parse an efetch PubmedArticleSet XML document.
         
+        Args:
+            body: efetch XML response
+            
+        Returns:
+            List of dictionaries with pmid, title and abstract
+        """
+        root = ET.fromstring(body)
+        articles = []
+        for node in root.iter('PubmedArticle'):
+            pmid = node.findtext('.//MedlineCitation/PMID', default='').strip()
+            if not pmid:
+                continue
+            title_node = node.find('.//Article/ArticleTitle')
+            title = ''.join(title_node.itertext()).strip() if title_node is not None else ''
+            
+            # Structured abstracts are split into labelled sections
+            sections = []
+            for part in node.findall('.//Article/Abstract/AbstractText'):
+                text = ''.join(part.itertext()).strip()
+                if not text:
+                    continue
+                label = part.get('Label')
+                sections.append(f"{label}: {text}" if label else text)
+            
+            articles.append({
+                'pmid': pmid,
+                'title': title,
+                'abstract': '\n'.join(sections)
+            })
         return articles
     
-    def fetch_medlineplus_topics(self) -> List[Dict[str, str]]:
+    async def _fetch_topic(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                           query: str, max_results: int) -> List[Dict[str, str]]:
+        """Search one query and fetch its articles."""
+        ids, _ = await self._search_ids(session, limiter, query, max_results)
+        if not ids:
+            return []
+        return await self._fetch_articles(session, limiter, ids)
+    
+    async def fetch_pubmed_articles_async(self, query: str,
+                                          max_results: int = 50) -> List[Dict[str, str]]:
         """
-        Fetch health topics from MedlinePlus.
+        Fetch articles from PubMed using E-utilities API.
         
+        Args:
+            query: Search query
+            max_results: Maximum number of articles to fetch
+            
         Returns:
-            List of topic dictionaries
+            List of article dictionaries
+        """
+        limiter = RateLimiter(self.requests_per_second)
+        async with self._create_session() as session:
+            return await self._fetch_topic(session, limiter, query, max_results)
+    
+    def fetch_pubmed_articles(self, query: str, max_results: int = 50) -> List[Dict[str, str]]:
         """
-        url = "https://medlineplus.gov/healthtopics.html"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        Fetch articles from PubMed using E-utilities API.
         
-        topics = []
+        Blocking wrapper around fetch_pubmed_articles_async().
+        
+        Args:
+            query: Search query
+            max_results: Maximum number of articles to fetch
+            
+        Returns:
+            List of article dictionaries
+        """
+        return asyncio.run(self.fetch_pubmed_articles_async(query, max_results))
+    
+    async def _fetch_cached(self, session: aiohttp.ClientSession, limiter: RateLimiter,
+                            url: str) -> str:
+        """
+        Fetch a page, revalidating any cached copy with ETag/Last-Modified.
+        
+        Args:
+            session: Shared HTTP session
+            limiter: Shared rate limiter
+            url: Page URL
+            
+        Returns:
+            Page body text
+        """
+        headers = self.http_cache.conditional_headers(url)
+        status, response_headers, body = await self._get(session, limiter, url, headers=headers)
+        if status == 304:
+            cached = self.http_cache.load(url)
+            if cached is not None:
+                return cached
+            # Cache entry vanished since the request was made
+            _, response_headers, body = await self._get(session, limiter, url)
+        self.http_cache.store(url, response_headers, body)
+        return body
+    
+    @staticmethod
+    def _extract_links(html: str, base_url: str) -> Tuple[List[str], List[str]]:
+        """
+        Find MedlinePlus index and topic page links in a page.
+        
+        Args:
+            html: Page HTML
+            base_url: URL of the page, for resolving relative links
+            
+        Returns:
+            Tuple of (index page URLs, topic page URLs), each deduplicated
+        """
+        host = urlparse(base_url).netloc
+        index_pages, topic_pages = {}, {}
+        soup = BeautifulSoup(html, 'html.parser')
         for link in soup.find_all('a', href=True):
-            if '/ency/' in link['href'] or link['href'].endswith('.html'):
-                topics.append({
-                    'title': link.text.strip(),
-                    'url': f"https://medlineplus.gov{link['href']}"
-                })
+            url = urljoin(base_url, link['href']).split('#')[0]
+            parsed = urlparse(url)
+            if parsed.netloc != host:
+                continue
+            if INDEX_PAGE_PATTERN.match(parsed.path):
+                index_pages.setdefault(url, None)
+            elif TOPIC_PAGE_PATTERN.match(parsed.path):
+                topic_pages.setdefault(url, None)
+        return list(index_pages), list(topic_pages)
+    
+    @staticmethod
+    def _extract_topic(html: str, url: str) -> Optional[Dict[str, str]]:
+        """
+        Extract the title and summary text of a MedlinePlus topic page.
         
-        return topics[:100]
+        Args:
+            html: Page HTML
+            url: Page URL
+            
+        Returns:
+            Topic dictionary, or None if the page has no topic summary
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        # Only health topic pages have a summary; site navigation pages don't
+        content = soup.find(id='topic-summary')
+        if content is None:
+            return None
+        for tag in content.find_all(['script', 'style', 'nav']):
+            tag.decompose()
+        
+        paragraphs = []
+        for node in content.find_all(['h2', 'h3', 'p', 'li']):
+            text = ' '.join(node.get_text(' ', strip=True).split())
+            if text and text not in paragraphs:
+                paragraphs.append(text)
+        if not paragraphs:
+            return None
+        
+        heading = soup.find('h1') or soup.find('title')
+        title = heading.get_text(' ', strip=True) if heading else url
+        return {
+            'title': title,
+            'text': '\n'.join(paragraphs),
+            'source': "MedlinePlus",
+            'url': url
+        }
+    
+    async def crawl_medlineplus_async(self, max_topics: int = 100,
+                                      max_workers: int = 4) -> List[Dict[str, str]]:
+        """
+        Crawl MedlinePlus health topic pages with a bounded worker pool.
+        
+        Topic URLs are taken from the alphabetical index pages linked
+        from the main page. Pages go through the on-disk HTTP cache, so a
+        re-crawl only transfers pages that changed since the last one,
+        and a page that fails transiently falls back to its cached copy.
+        
+        Args:
+            max_topics: Maximum number of topics
+            max_workers: Number of concurrent page fetches
+            
+        Returns:
+            List of topic dictionaries with title, text, source and url
+        """
+        limiter = RateLimiter(self.medlineplus_requests_per_second)
+        
+        async def run_pool(urls: List[str], handle, done=lambda: False) -> None:
+            queue = asyncio.Queue()
+            for url in urls:
+                queue.put_nowait(url)
+            
+            async def worker() -> None:
+                while not queue.empty() and not done():
+                    url = queue.get_nowait()
+                    try:
+                        html = await self._fetch_cached(session, limiter, url)
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        # Keep the last good copy unless the page is really gone
+                        transient = (not isinstance(e, aiohttp.ClientResponseError)
+                                     or e.status in RETRY_STATUSES)
+                        html = self.http_cache.load(url) if transient else None
+                        print(f"Failed to fetch {url}: {e}"
+                              + ("; using cached copy" if html is not None else ""))
+                        if html is None:
+                            continue
+                    handle(url, html)
+            
+            await asyncio.gather(*[worker() for _ in range(max_workers)])
+        
+        async with self._create_session() as session:
+            index_html = await self._fetch_cached(session, limiter, self.medlineplus_url)
+            index_pages, _ = self._extract_links(index_html, self.medlineplus_url)
+            
+            # The main page links to alphabetical index pages listing the topics;
+            # its own links are mostly site navigation
+            topic_urls = []
+            
+            def add_topic_links(url: str, html: str) -> None:
+                for topic_url in self._extract_links(html, url)[1]:
+                    if topic_url not in topic_urls:
+                        topic_urls.append(topic_url)
+            
+            await run_pool([url for url in index_pages if url != self.medlineplus_url],
+                           add_topic_links)
+            topic_urls = [url for url in topic_urls if url not in index_pages]
+            
+            topics = {}
+            
+            def add_topic(url: str, html: str) -> None:
+                topic = self._extract_topic(html, url)
+                if topic:
+                    topics[url] = topic
+            
+            # Pages that turn out not to be topics don't count toward max_topics
+            await run_pool(topic_urls, add_topic, done=lambda: len(topics) >= max_topics)
+        
+        print(f"MedlinePlus: {self.http_cache.hits} pages unchanged, "
+              f"{self.http_cache.misses} downloaded")
+        return [topics[url] for url in topic_urls if url in topics][:max_topics]
+    
+    def fetch_medlineplus_topics(self, max_topics: int = 100) -> List[Dict[str, str]]:
+        """
+        Fetch health topics from MedlinePlus.
+        
+        Blocking wrapper around crawl_medlineplus_async().
+        
+        Args:
+            max_topics: Maximum number of topic pages
+            
+        Returns:
+            List of topic dictionaries
+        """
+        return asyncio.run(self.crawl_medlineplus_async(max_topics))
     
     def save_data(self, data: List[Dict[str, Any]], filename: str) -> None:
         """
@@ -102,37 +547,116 @@ class MedicalDataCollector:
             json.dump(data, f, indent=2, ensure_ascii=False)
         print(f"Saved {len(data)} items to {filepath}")
     
-    def collect_all(self) -> List[Dict[str, str]]:
+    async def collect_all_async(self, topics: Optional[List[str]] = None,
+                                max_results: int = 10) -> Dict[str, Any]:
+        """
+        Fetch new articles for all topics concurrently.
+        
+        All topics share one connection pool and one rate limiter. Each
+        topic is checkpointed to the corpus store as soon as it completes,
+        so a failed run keeps the progress of the topics that finished.
+        
+        Args:
+            topics: Search queries (defaults to DEFAULT_TOPICS)
+            max_results: Maximum new articles per topic
+            
+        Returns:
+            Changeset dictionary containing:
+            - run_id: Identifier of this collection run
+            - added: Articles not seen in any previous run
+            - failed_topics: Topic -> error message for topics to retry
+        """
+        topics = topics or DEFAULT_TOPICS
+        limiter = RateLimiter(self.requests_per_second)
+        today = date.today().strftime("%Y/%m/%d")
+        run_id = datetime.now().strftime("%Y%m%dT%H%M%S-") + uuid.uuid4().hex[:6]
+        # PMIDs being fetched by another topic in this run
+        claimed = set()
+        
+        async with self._create_session() as session:
+            async def fetch(topic: str) -> List[Dict[str, str]]:
+                last_fetch = self.store.get_last_fetch(topic)
+                print(f"Fetching articles for: {topic}"
+                      + (f" (since {last_fetch})" if last_fetch else ""))
+                
+                # Page through the date window until it is exhausted or
+                # max_results new articles are found. The first run only
+                # takes the newest max_results; there is no window to finish.
+                new_ids, retstart = [], 0
+                while True:
+                    ids, count = await self._search_ids(
+                        session, limiter, topic,
+                        ESEARCH_PAGE_SIZE if last_fetch else max_results,
+                        mindate=last_fetch,
+                        maxdate=today if last_fetch else None,
+                        retstart=retstart
+                    )
+                    retstart += len(ids)
+                    unseen = [pmid for pmid in ids
+                              if pmid not in self.store.seen_pmids and pmid not in claimed]
+                    room = max_results - len(new_ids)
+                    new_ids.extend(unseen[:room])
+                    truncated = len(unseen) > room
+                    exhausted = not ids or retstart >= count
+                    if truncated or exhausted or not last_fetch:
+                        break
+                claimed.update(new_ids)
+                
+                articles = await self._fetch_articles(session, limiter, new_ids) if new_ids else []
+                for article in articles:
+                    article['topic'] = topic
+                
+                added = self.store.append_articles(articles)
+                # Leave the watermark if articles in the window were left for the next run
+                if not last_fetch or not truncated:
+                    self.store.set_last_fetch(topic, today)
+                return added
+            
+            results = await asyncio.gather(*[fetch(topic) for topic in topics],
+                                           return_exceptions=True)
+        
+        changeset = {"run_id": run_id, "added": [], "failed_topics": {}}
+        for topic, result in zip(topics, results):
+            if isinstance(result, BaseException):
+                changeset["failed_topics"][topic] = str(result) or type(result).__name__
+            else:
+                changeset["added"].extend(result)
+        return changeset
+    
+    def collect_all(self) -> Dict[str, Any]:
         """
-        Collect data from all sources.
+        Collect new data from all sources.
+        
+        New PubMed articles are appended to the corpus store and queued as
+        pending changes for MedicalRAG.apply_corpus_changes(). MedlinePlus
+        topics are saved to medlineplus_topics.json.
         
         Returns:
-            List of all collected articles
+            Changeset dictionary (see collect_all_async)
         """
         print("Collecting medical data...")
         
-        # Common medical topics
-        topics = [
-            "anatomy basics",
-            "cardiovascular system",
-            "respiratory system",
-            "digestive system",
-            "nervous system",
-            "diabetes mellitus",
-            "hypertension",
-            "infectious diseases"
-        ]
-        
-        all_articles = []
-        for topic in topics:
-            print(f"Fetching articles for: {topic}")
-            articles = self.fetch_pubmed_articles(topic, max_results=10)
-            all_articles.extend(articles)
-        
-        self.save_data(all_articles, "pubmed_articles.json")
+        async def collect_sources():
+            # Different hosts with separate rate limits, so crawl both at once
+            return await asyncio.gather(self.collect_all_async(),
+                                        self.crawl_medlineplus_async(),
+                                        return_exceptions=True)
+        
+        changeset, medlineplus_topics = asyncio.run(collect_sources())
+        if isinstance(changeset, BaseException):
+            raise changeset
+        
+        print(f"Added {len(changeset['added'])} new articles to {self.store.articles_file}")
+        for topic, error in changeset["failed_topics"].items():
+            print(f"Failed to fetch '{topic}': {error} (will retry next run)")
+        
+        if isinstance(medlineplus_topics, BaseException):
+            print(f"Failed to crawl MedlinePlus: {medlineplus_topics}")
+        else:
+            self.save_data(medlineplus_topics, "medlineplus_topics.json")
         
         print("\nData collection complete!")
-        return all_articles
+        return changeset
 
 if __name__ == "__main__":
     collector = MedicalDataCollector()
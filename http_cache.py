@@ -0,0 +1,113 @@
+"""
+HTTP Cache
+
+On-disk cache of HTTP responses for conditional re-fetching.
+Stores each body with its ETag/Last-Modified validators so a re-crawl
+only transfers pages that changed on the server.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional, Any, Mapping, Tuple
+
+class HTTPCache:
+    """
+    Caches response bodies keyed by URL.
+    
+    Each entry is two files in cache_dir: <key>.body with the response
+    text and <key>.json with the URL and its validators.
+    """
+    
+    def __init__(self, cache_dir: str = "medical_data/http_cache"):
+        """
+        Initialize HTTP cache.
+        
+        Args:
+            cache_dir: Directory for cached responses
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+    
+    def _paths(self, url: str) -> Tuple[str, str]:
+        """Get the (metadata, body) file paths for a URL."""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".body"
+    
+    def _load_meta(self, url: str) -> Optional[Dict[str, Any]]:
+        """Load entry metadata, or None if the entry is missing or incomplete."""
+        meta_file, body_file = self._paths(url)
+        if not (os.path.exists(meta_file) and os.path.exists(body_file)):
+            return None
+        with open(meta_file, 'r') as f:
+            return json.load(f)
+    
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Get request headers that revalidate the cached entry.
+        
+        Args:
+            url: Request URL
+            
+        Returns:
+            If-None-Match/If-Modified-Since headers, empty if not cached
+        """
+        meta = self._load_meta(url)
+        if not meta:
+            return {}
+        
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+    
+    def load(self, url: str) -> Optional[str]:
+        """
+        Get the cached body for a URL after a 304 Not Modified.
+        
+        Args:
+            url: Request URL
+            
+        Returns:
+            Cached body text, or None if not cached
+        """
+        _, body_file = self._paths(url)
+        if not os.path.exists(body_file):
+            return None
+        self.hits += 1
+        with open(body_file, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def store(self, url: str, headers: Mapping[str, str], body: str) -> None:
+        """
+        Cache a 200 response if it carries validators.
+        
+        Args:
+            url: Request URL
+            headers: Response headers
+            body: Response body text
+        """
+        self.misses += 1
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not (etag or last_modified):
+            return
+        
+        meta_file, body_file = self._paths(url)
+        # Body first, so metadata never points at a missing or stale body
+        for path, content in ((body_file, body), (meta_file, json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": datetime.now().isoformat()
+        }, indent=2))):
+            tmp_file = path + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_file, path)
@@ -0,0 +1,270 @@
+"""
+Request Tracing and Metrics
+
+Per-request timing spans and counters for the ask() pipeline,
+aggregated into Prometheus metrics and logged as structured JSON.
+Includes an opt-in sampling profiler for capturing slow requests.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Any, Iterator
+
+logger = logging.getLogger("medical_rag")
+
+# Histogram buckets in seconds, from fast retrieval stages to slow CPU generation
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Trace:
+    """
+    Timing spans and counters for a single request.
+    
+    Usage:
+        trace = Trace()
+        with trace.span("retrieve"):
+            docs = retrieve(question)
+        trace.count("retrieved_chunks", len(docs))
+        trace.finish()
+    """
+    
+    def __init__(self, request_id: Optional[str] = None):
+        """
+        Initialize trace.
+        
+        Args:
+            request_id: Request identifier (generated if not given)
+        """
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.duration: Optional[float] = None
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+    
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Record time spent in a stage measured elsewhere.
+        
+        Args:
+            name: Stage name
+            seconds: Duration in seconds
+        """
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+    
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Increment a per-request counter.
+        
+        Args:
+            name: Counter name, e.g. "tokens_out"
+            value: Amount to add
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def finish(self) -> None:
+        """Mark the request as complete."""
+        self.duration = time.perf_counter() - self._start
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the trace as a JSON-serializable dictionary.
+        
+        Returns:
+            Dictionary with request_id, timings in ms, and counters
+        """
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "stages_ms": {name: round(s * 1000, 3) for name, s in self.spans.items()},
+            "counters": dict(self.counters)
+        }
+
+class MetricsRegistry:
+    """
+    Aggregates finished traces into Prometheus histograms and counters.
+    
+    Thread-safe, so one registry can be shared by concurrent requests.
+    """
+    
+    def __init__(self, prefix: str = "medical_rag"):
+        """
+        Initialize metrics registry.
+        
+        Args:
+            prefix: Metric name prefix
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stage_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._stage_sum = defaultdict(float)
+        self._stage_count = defaultdict(int)
+        self._counters = defaultdict(int)
+    
+    def observe(self, trace: Trace) -> None:
+        """
+        Add a finished trace to the metrics.
+        
+        Args:
+            trace: Finished request trace
+        """
+        stages = dict(trace.spans)
+        if trace.duration is not None:
+            stages["total"] = trace.duration
+        
+        with self._lock:
+            self._counters["requests"] += 1
+            for name, seconds in stages.items():
+                buckets = self._stage_buckets[name]
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+                self._stage_sum[name] += seconds
+                self._stage_count[name] += 1
+            for name, value in trace.counters.items():
+                self._counters[name] += value
+    
+    def increment(self, name: str, value: int = 1) -> None:
+        """
+        Increment a counter outside of a request trace.
+        
+        Args:
+            name: Counter name
+            value: Amount to add
+        """
+        with self._lock:
+            self._counters[name] += value
+    
+    def render_prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        
+        Returns:
+            Metrics text
+        """
+        name = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each ask() stage; stage=\"total\" is the whole request.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            for stage in sorted(self._stage_count):
+                for bound, count in zip(LATENCY_BUCKETS, self._stage_buckets[stage]):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {self._stage_count[stage]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {self._stage_sum[stage]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {self._stage_count[stage]}')
+            
+            for counter in sorted(self._counters):
+                counter_name = f"{self.prefix}_{counter}_total"
+                lines.append(f"# TYPE {counter_name} counter")
+                lines.append(f"{counter_name} {self._counters[counter]}")
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread at a fixed interval.
+    
+    Runs in a background thread while a request is in flight; the result
+    is a folded-stack profile that flamegraph tools can render.
+    """
+    
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        """
+        Initialize sampling profiler.
+        
+        Args:
+            thread_id: Thread to sample (defaults to the calling thread)
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _run(self) -> None:
+        """Collect samples until stopped."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+    
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+    
+    def save(self, path: str) -> None:
+        """
+        Write the profile in folded-stack format ("a;b;c <count>" per line).
+        
+        Args:
+            path: Output file
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+def log_trace(trace: Trace) -> None:
+    """Log a finished trace as one structured JSON line."""
+    logger.info(json.dumps(trace.to_dict()))
+
+def start_metrics_server(registry: MetricsRegistry, port: int = 9100,
+                         host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve registry metrics at http://host:port/metrics in a background thread.
+    
+    Args:
+        registry: Metrics to expose
+        port: Port to listen on
+        host: Interface to bind
+        
+    Returns:
+        The running server
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args) -> None:
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -7,8 +7,52 @@ All data is stored locally in JSON format.
 
 import json
 import os
+import re
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+
+# Number of recent values kept per metric
+TREND_WINDOW = 5
+
+# Slopes over shorter spans are noise, and extrapolate absurdly to a month
+MIN_TREND_SPAN_DAYS = 1.0
+
+# Normal ranges per numeric component, matched by metric name prefix.
+# Blood pressure has two components: systolic and diastolic.
+REFERENCE_RANGES = {
+    "blood pressure": [(90, 129), (60, 79)],
+    "heart rate": [(60, 100)],
+    "blood sugar": [(70, 99)],
+    "bmi": [(18.5, 24.9)],
+    "temperature": [(97.0, 99.5)],
+    "oxygen saturation": [(95, 100)],
+    "cholesterol": [(0, 199)],
+    "hba1c": [(0, 5.6)]
+}
+
+# Unit of each reference range (normalized: lowercase, no spaces or degree sign).
+# Readings without a unit are assumed to be in it.
+REFERENCE_UNITS = {
+    "blood pressure": "mmhg",
+    "heart rate": "bpm",
+    "blood sugar": "mg/dl",
+    "bmi": "",
+    "temperature": "f",
+    "oxygen saturation": "%",
+    "cholesterol": "mg/dl",
+    "hba1c": "%"
+}
+
+# Linear conversions into the reference unit: reference = value * scale + offset.
+# Readings in units without a conversion are not checked or mixed into trends.
+UNIT_CONVERSIONS = {
+    ("temperature", "c"): (9 / 5, 32.0),
+    ("blood sugar", "mmol/l"): (18.0, 0.0),
+    ("cholesterol", "mmol/l"): (38.67, 0.0)
+}
+
+UNIT_ALIASES = {"celsius": "c", "fahrenheit": "f", "kg/m2": "", "kg/m^2": ""}
 
 class PatientManager:
     """
@@ -17,7 +61,10 @@ class PatientManager:
     Features:
     - Add/retrieve patient information
     - Store health measurements with timestamps
-    - Generate summaries for RAG integration
+    - Maintain rolling per-metric trends (recent values, min/max/mean,
+      slope, last abnormal reading), updated in O(1) per measurement
+    - Generate summaries for RAG integration, cached per patient
+    - Paginated search for the patient list UI
     """
     
     def __init__(self, data_dir: str = "patient_data"):
@@ -30,7 +77,19 @@ class PatientManager:
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
         self.patients_file = os.path.join(data_dir, "patients.json")
+        # Changes, invalidation and summary cache fills hold the lock, so a
+        # summary built from old data can never be stored after an invalidation
+        self._lock = threading.RLock()
         self.patients = self.load_patients()
+        
+        # Search index in insertion order: patient IDs, and ID and name in
+        # lowercase for filtering; add_patient appends to both
+        self._patient_ids: List[str] = list(self.patients)
+        self._search_keys: List[str] = [f"{pid}\n{patient['name']}".lower()
+                                        for pid, patient in self.patients.items()]
+        
+        # Summaries are rebuilt only after the patient changes
+        self._summary_cache: Dict[str, str] = {}
     
     def load_patients(self) -> Dict[str, Any]:
         """
@@ -41,12 +100,25 @@ class PatientManager:
         """
         if os.path.exists(self.patients_file):
             with open(self.patients_file, 'r') as f:
-                return json.load(f)
+                patients = json.load(f)
+            
+            # Records saved before trends existed: build them once from history
+            migrated = False
+            for patient in patients.values():
+                if "trends" not in patient:
+                    patient["trends"] = {}
+                    for entry in patient["measurements"]:
+                        self._update_trends(patient, entry["timestamp"], entry["data"])
+                    migrated = True
+            if migrated:
+                self.patients = patients
+                self.save_patients()
+            return patients
         return {}
     
     def save_patients(self) -> None:
         """Save patient data to JSON file."""
-        with open(self.patients_file, 'w') as f:
+        with self._lock, open(self.patients_file, 'w') as f:
             json.dump(self.patients, f, indent=2)
     
     def add_patient(self, patient_id: str, name: str, age: int, gender: str) -> bool:
@@ -62,16 +134,21 @@ class PatientManager:
         Returns:
             True if patient added, False if already exists
         """
-        if patient_id not in self.patients:
-            self.patients[patient_id] = {
-                "name": name,
-                "age": age,
-                "gender": gender,
-                "measurements": [],
-                "created_at": datetime.now().isoformat()
-            }
-            self.save_patients()
-            return True
+        with self._lock:
+            if patient_id not in self.patients:
+                self.patients[patient_id] = {
+                    "name": name,
+                    "age": age,
+                    "gender": gender,
+                    "measurements": [],
+                    "trends": {},
+                    "created_at": datetime.now().isoformat()
+                }
+                self._patient_ids.append(patient_id)
+                self._search_keys.append(f"{patient_id}\n{name}".lower())
+                self.invalidate_summary(patient_id)
+                self.save_patients()
+                return True
         return False
     
     def add_measurements(self, patient_id: str, measurements: Dict[str, str]) -> bool:
@@ -85,17 +162,260 @@ class PatientManager:
         Returns:
             True if successful, False if patient not found
         """
-        if patient_id not in self.patients:
+        with self._lock:
+            if patient_id not in self.patients:
+                return False
+            
+            measurement_entry = {
+                "timestamp": datetime.now().isoformat(),
+                "data": measurements
+            }
+            
+            patient = self.patients[patient_id]
+            patient["measurements"].append(measurement_entry)
+            self._update_trends(patient, measurement_entry["timestamp"], measurements)
+            self.invalidate_summary(patient_id)
+            self.save_patients()
+        return True
+    
+    def invalidate_summary(self, patient_id: str) -> None:
+        """
+        Drop a patient's cached summary after their record changes.
+        
+        Called by add_patient and add_measurements; call it after
+        modifying a record directly.
+        
+        Args:
+            patient_id: Patient identifier
+        """
+        with self._lock:
+            self._summary_cache.pop(patient_id, None)
+    
+    def _parse_value(self, value: str) -> Tuple[List[float], str]:
+        """
+        Parse a measurement value into numbers and a unit.
+        
+        Args:
+            value: Value as entered, e.g. "140/90 mmHg" or "98.6°F"
+            
+        Returns:
+            Tuple of (numeric components, unit); no components if not numeric
+        """
+        match = re.match(r"\s*(-?\d+(?:\.\d+)?(?:\s*/\s*-?\d+(?:\.\d+)?)*)\s*(.*)", str(value))
+        if not match:
+            return [], ""
+        numbers = [float(part) for part in match.group(1).split('/')]
+        return numbers, match.group(2).strip()
+    
+    @staticmethod
+    def _reference_prefix(name: str) -> Optional[str]:
+        """Get the REFERENCE_RANGES key for a metric name, if any."""
+        key = name.lower()
+        for prefix in REFERENCE_RANGES:
+            if key.startswith(prefix):
+                return prefix
+        return None
+    
+    @staticmethod
+    def _normalize_unit(unit: str) -> str:
+        """Normalize a unit for comparison, e.g. "°C" -> "c"."""
+        unit = unit.lower().replace("°", "").replace(" ", "")
+        return UNIT_ALIASES.get(unit, unit)
+    
+    def _convert(self, name: str, numbers: List[float], unit: str,
+                 target: str) -> Optional[List[float]]:
+        """
+        Convert a reading from one unit to another.
+        
+        A reading without a unit is assumed to be in the target unit.
+        
+        Args:
+            name: Metric name
+            numbers: Numeric components of the reading
+            unit: Unit of the reading
+            target: Unit to convert to
+            
+        Returns:
+            Converted components, or None if no conversion is known
+        """
+        unit, target = self._normalize_unit(unit), self._normalize_unit(target)
+        if not unit or unit == target:
+            return list(numbers)
+        
+        prefix = self._reference_prefix(name)
+        if prefix is None:
+            return None
+        reference = REFERENCE_UNITS[prefix]
+        target = target or reference
+        
+        # Via the reference unit: reference = value * scale + offset
+        if unit != reference:
+            if (prefix, unit) not in UNIT_CONVERSIONS:
+                return None
+            scale, offset = UNIT_CONVERSIONS[(prefix, unit)]
+            numbers = [number * scale + offset for number in numbers]
+        if target != reference:
+            if (prefix, target) not in UNIT_CONVERSIONS:
+                return None
+            scale, offset = UNIT_CONVERSIONS[(prefix, target)]
+            numbers = [(number - offset) / scale for number in numbers]
+        return list(numbers)
+    
+    def _is_abnormal(self, name: str, numbers: List[float], unit: str = "") -> bool:
+        """
+        Check a reading against the reference range for its metric.
+        
+        Readings in another unit are converted when a conversion is
+        known (e.g. °C to °F) and otherwise never flagged.
+        
+        Args:
+            name: Metric name
+            numbers: Numeric components of the reading
+            unit: Unit as entered, e.g. "°C"
+            
+        Returns:
+            True if any component is outside its normal range
+        """
+        prefix = self._reference_prefix(name)
+        if prefix is None:
             return False
+        numbers = self._convert(name, numbers, unit, REFERENCE_UNITS[prefix])
+        if numbers is None:
+            return False
+        return any(not low <= number <= high
+                   for number, (low, high) in zip(numbers, REFERENCE_RANGES[prefix]))
+    
+    def _update_trends(self, patient: Dict[str, Any], timestamp: str,
+                       measurements: Dict[str, str]) -> None:
+        """
+        Fold one measurement entry into the patient's rolling trends.
         
-        measurement_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "data": measurements
-        }
+        Keeps running sums for mean and least-squares slope, so the cost
+        is constant per metric regardless of history length. Readings are
+        converted to the unit of the metric's first reading; readings in a
+        unit that can't be converted are left out of the aggregates.
         
-        self.patients[patient_id]["measurements"].append(measurement_entry)
-        self.save_patients()
-        return True
+        Args:
+            patient: Patient record
+            timestamp: ISO timestamp of the entry
+            measurements: Measurement name -> value
+        """
+        when = datetime.fromisoformat(timestamp)
+        for name, value in measurements.items():
+            numbers, unit = self._parse_value(value)
+            if not numbers:
+                continue
+            
+            trend = patient["trends"].get(name)
+            if trend is None or len(trend["min"]) != len(numbers):
+                trend = patient["trends"][name] = {
+                    "unit": unit,
+                    "count": 0,
+                    "recent": [],
+                    "first_at": timestamp,
+                    "min": list(numbers),
+                    "max": list(numbers),
+                    "sum": [0.0] * len(numbers),
+                    "sum_t": 0.0,
+                    "sum_tt": 0.0,
+                    "sum_ty": [0.0] * len(numbers),
+                    "last_abnormal": None
+                }
+            
+            if self._is_abnormal(name, numbers, unit):
+                trend["last_abnormal"] = [timestamp, value]
+            
+            # Aggregate in the trend's unit, e.g. a °C reading into a °F trend
+            converted = self._convert(name, numbers, unit, trend["unit"])
+            if converted is None:
+                continue
+            
+            # Time axis in days since the metric was first recorded
+            t = (when - datetime.fromisoformat(trend["first_at"])).total_seconds() / 86400
+            trend["count"] += 1
+            trend["recent"] = (trend["recent"] + [[timestamp, value]])[-TREND_WINDOW:]
+            trend["sum_t"] += t
+            trend["sum_tt"] += t * t
+            for i, number in enumerate(converted):
+                trend["min"][i] = min(trend["min"][i], number)
+                trend["max"][i] = max(trend["max"][i], number)
+                trend["sum"][i] += number
+                trend["sum_ty"][i] += t * number
+    
+    def get_patient_trends(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get per-metric statistics computed from the rolling trends.
+        
+        Args:
+            patient_id: Patient identifier
+            
+        Returns:
+            Dictionary of metric name -> statistics, or None if patient not found
+        """
+        patient = self.get_patient(patient_id)
+        if not patient:
+            return None
+        
+        # Held throughout, so a measurement being added is seen whole or not at all
+        with self._lock:
+            trends = {}
+            for name, trend in patient.get("trends", {}).items():
+                n = trend["count"]
+                denominator = n * trend["sum_tt"] - trend["sum_t"] ** 2
+                # Days from the first reading to the latest one
+                span = (datetime.fromisoformat(trend["recent"][-1][0])
+                        - datetime.fromisoformat(trend["first_at"])).total_seconds() / 86400
+                slope = None
+                if n >= 2 and span >= MIN_TREND_SPAN_DAYS and denominator > 1e-9:
+                    slope = [(n * sum_ty - trend["sum_t"] * total) / denominator
+                             for sum_ty, total in zip(trend["sum_ty"], trend["sum"])]
+                trends[name] = {
+                    "unit": trend["unit"],
+                    "count": n,
+                    "recent": [value for _, value in trend["recent"]],
+                    "min": list(trend["min"]),
+                    "max": list(trend["max"]),
+                    "mean": [total / n for total in trend["sum"]],
+                    "span_days": span,
+                    "slope_per_day": slope,
+                    "last_abnormal": trend["last_abnormal"]
+                }
+        return trends
+    
+    def _format_trends(self, patient_id: str) -> str:
+        """
+        Format trend lines for metrics measured more than once.
+        
+        Args:
+            patient_id: Patient identifier
+            
+        Returns:
+            Trend section of the summary, empty if there is no history
+        """
+        def join(numbers: List[float], signed: bool = False) -> str:
+            return "/".join(f"{n:+.1f}" if signed else f"{n:g}" for n in numbers)
+        
+        lines = []
+        for name, stats in (self.get_patient_trends(patient_id) or {}).items():
+            if stats["count"] < 2:
+                continue
+            unit = f" {stats['unit']}" if stats["unit"] else ""
+            line = (f"- {name}: {' -> '.join(stats['recent'])} "
+                    f"(last {len(stats['recent'])} of {stats['count']}; "
+                    f"min {join(stats['min'])}, max {join(stats['max'])}, "
+                    f"mean {'/'.join(f'{m:.1f}' for m in stats['mean'])}{unit})")
+            if stats["slope_per_day"]:
+                per_month = [s * 30 for s in stats["slope_per_day"]]
+                direction = "rising" if per_month[0] > 0 else "falling" if per_month[0] < 0 else "stable"
+                line += f", {direction} {join(per_month, signed=True)}{unit} per month"
+            if stats["last_abnormal"]:
+                when, value = stats["last_abnormal"]
+                line += f", last abnormal {value} on {when[:10]}"
+            lines.append(line)
+        
+        if not lines:
+            return ""
+        return "Trends:\n" + "\n".join(lines) + "\n"
     
     def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -122,29 +442,41 @@ class PatientManager:
         """
         Get formatted patient summary for display and RAG.
         
+        Summaries are cached until the patient changes.
+        
         Args:
             patient_id: Patient identifier
             
         Returns:
             Formatted summary string or None
         """
-        patient = self.get_patient(patient_id)
-        if not patient:
-            return None
-        
-        summary = f"Patient ID: {patient_id}\n"
-        summary += f"Name: {patient['name']}\n"
-        summary += f"Age: {patient['age']} years\n"
-        summary += f"Gender: {patient['gender']}\n\n"
-        
-        if patient['measurements']:
-            summary += "Latest Measurements:\n"
-            latest = patient['measurements'][-1]
-            summary += f"Date: {latest['timestamp']}\n"
-            for key, value in latest['data'].items():
-                summary += f"- {key}: {value}\n"
-        
-        return summary
+        with self._lock:
+            summary = self._summary_cache.get(patient_id)
+            if summary is not None:
+                return summary
+            
+            patient = self.get_patient(patient_id)
+            if not patient:
+                return None
+            
+            summary = f"Patient ID: {patient_id}\n"
+            summary += f"Name: {patient['name']}\n"
+            summary += f"Age: {patient['age']} years\n"
+            summary += f"Gender: {patient['gender']}\n\n"
+            
+            if patient['measurements']:
+                summary += "Latest Measurements:\n"
+                latest = patient['measurements'][-1]
+                summary += f"Date: {latest['timestamp']}\n"
+                for key, value in latest['data'].items():
+                    summary += f"- {key}: {value}\n"
+                
+                trends = self._format_trends(patient_id)
+                if trends:
+                    summary += f"\n{trends}"
+            
+            self._summary_cache[patient_id] = summary
+            return summary
     
     def get_all_patient_summaries(self) -> List[str]:
         """
@@ -154,11 +486,43 @@ class PatientManager:
             List of formatted patient summaries
         """
         summaries = []
-        for patient_id in self.patients:
+        # Snapshot the IDs; background index rebuilds call this while patients are added
+        with self._lock:
+            patient_ids = list(self.patients)
+        for patient_id in patient_ids:
             summary = self.get_patient_summary(patient_id)
             if summary:
                 summaries.append(summary)
         return summaries
+    
+    def search_patients(self, query: str = "", page: int = 1,
+                        page_size: int = 20) -> Tuple[List[str], int]:
+        """
+        Get one page of patient summaries, optionally filtered.
+        
+        Only the summaries on the requested page are built (or read
+        from the cache). Without a query the page is sliced from the
+        patient ID list, so its cost does not grow with the patient
+        count; a query scans every patient's ID and name.
+        
+        Args:
+            query: Case-insensitive text to match in patient ID or name
+            page: Page number, starting at 1
+            page_size: Patients per page
+            
+        Returns:
+            Tuple of (summaries on the page, total matching patients)
+        """
+        query = query.strip().lower()
+        start = (max(page, 1) - 1) * page_size
+        with self._lock:
+            if query:
+                matches = [pid for pid, key in zip(self._patient_ids, self._search_keys)
+                           if query in key]
+                page_ids, total = matches[start:start + page_size], len(matches)
+            else:
+                page_ids, total = self._patient_ids[start:start + page_size], len(self._patient_ids)
+        return [self.get_patient_summary(pid) for pid in page_ids], total
 
 if __name__ == "__main__":
     # Quick test
@@ -6,20 +6,170 @@ for medical question answering using local LLMs and vector databases.
 """
 
 import os
+import re
 import json
+import logging
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+import numpy as np
 import torch
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Iterator, Tuple, TextIO
+
+try:
+    import fcntl
+except ImportError:  # Windows: other processes' stale versions are never swept
+    fcntl = None
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_community.utils.math import cosine_similarity
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import HuggingFacePipeline
 from langchain.chains import RetrievalQA
+from langchain.embeddings.base import Embeddings
+from langchain.llms.base import BaseLLM
 from langchain.prompts import PromptTemplate
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from langchain.schema import Document
+from transformers import (AutoTokenizer, AutoModelForCausalLM, StoppingCriteria,
+                          StoppingCriteriaList, pipeline)
+
+import chromadb
+from chromadb.config import Settings
 
+from corpus_store import CorpusStore
+from metrics import MetricsRegistry, SamplingProfiler, Trace, log_trace
 from patient_manager import PatientManager
 
+logger = logging.getLogger("medical_rag")
+
+# Index builds live in persist_directory/v<timestamp>-<suffix>. Each process
+# holds a shared lock on .in_use in the versions it builds or serves.
+INDEX_VERSION_PATTERN = re.compile(r"^v\d{14}-[0-9a-f]{6}$")
+
+# Soft generation budgets (new tokens) by question type, first match wins.
+# Decoding stops at the first sentence end past the budget.
+GENERATION_BUDGETS = [
+    (re.compile(r"\b(list|symptoms|causes|risk factors|treatments?|compare|steps|types|side effects)\b"), 160),
+    (re.compile(r"^(is|are|does|do|can|should|could|will|was|has|have)\b"), 64),
+    (re.compile(r"^(what is|what are|what's|define|who)\b"), 96),
+]
+DEFAULT_GENERATION_BUDGET = 128
+# Tokens allowed past the budget to finish the current sentence
+GENERATION_GRACE_TOKENS = 40
+# Sentence punctuation followed by whitespace, then at most one partial word.
+# A bare trailing "." may be a decimal point still being generated ("6." of "6.5").
+SENTENCE_END_PATTERN = re.compile(r"[.!?]\s+\S*$")
+
+# PMID in a legacy record's source ("PubMed ID: 123") or URL (".../123/")
+LEGACY_PMID_PATTERN = re.compile(r"(?:PubMed ID: |pubmed\.ncbi\.nlm\.nih\.gov/)(\d+)")
+
+# Returned instead of generating when no retrieved chunk is relevant enough
+NOT_FOUND_ANSWER = ("I could not find information about this in the knowledge base. "
+                    "Try rephrasing the question or adding relevant documents.")
+
+class IndexVersion:
+    """
+    One complete build of the vector store in its own directory.
+    
+    Queries hold a reader reference while they search it. A version
+    replaced by a newer build is retired and deleted once its last
+    reader has finished.
+    """
+    
+    def __init__(self, name: str, path: str, client: chromadb.ClientAPI, vectorstore: Chroma,
+                 in_use: TextIO):
+        """
+        Initialize index version.
+        
+        Args:
+            name: Version directory name
+            path: Version directory
+            client: Chroma client owning path
+            vectorstore: Vector store persisted in path
+            in_use: Open .in_use file holding the version's shared lock
+        """
+        self.name = name
+        self.path = path
+        self.client = client
+        self.vectorstore = vectorstore
+        self.in_use = in_use
+        self.readers = 0
+        self.retired = False
+
+class GenerationTimer(StoppingCriteria):
+    """
+    Records token timing during generation without ever stopping it.
+    
+    generate() calls stopping criteria once per new token, so the first
+    call marks the end of prefill and the call count is the output length.
+    """
+    
+    def __init__(self):
+        """Initialize generation timer."""
+        self.first_token_at = None
+        self.prompt_tokens = 0
+        self.new_tokens = 0
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self.prompt_tokens = input_ids.shape[-1] - 1
+        self.new_tokens += 1
+        return False
+
+class AnswerStoppingCriteria(StoppingCriteria):
+    """
+    Ends decoding once the rest of the answer would be thrown away.
+    
+    Stops when the request is cancelled, when the model starts repeating
+    a line it already wrote (which _clean_answer would drop), or at the
+    first sentence end after the token budget is spent. A sentence end is
+    only recognized once whitespace follows the punctuation; the start of
+    the next sentence is then trimmed by _clean_answer.
+    """
+    
+    def __init__(self, tokenizer: Any, budget: int,
+                 cancel_event: Optional[threading.Event] = None):
+        """
+        Initialize answer stopping criteria.
+        
+        Args:
+            tokenizer: Tokenizer of the generating model
+            budget: New tokens after which to stop at a sentence end
+            cancel_event: Stop as soon as this is set
+        """
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.cancel_event = cancel_event
+        self.prompt_length = None
+        self.reason = None
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[-1] - 1
+        
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.reason = "cancelled"
+            return True
+        
+        new_tokens = input_ids.shape[-1] - self.prompt_length
+        text = self.tokenizer.decode(input_ids[0, self.prompt_length:], skip_special_tokens=True)
+        
+        if text.endswith("\n"):
+            lines = [line.strip() for line in text.split("\n") if line.strip()]
+            if lines and lines[-1] in lines[:-1]:
+                self.reason = "repeated_line"
+                return True
+        
+        if new_tokens >= self.budget and SENTENCE_END_PATTERN.search(text):
+            self.reason = "sentence_end"
+            return True
+        return False
+
 class MedicalRAG:
     """
     Medical RAG System with optimized retrieval and generation.
@@ -27,26 +177,104 @@ class MedicalRAG:
     Features:
     - Local LLM (TinyLlama) for privacy
     - MMR retrieval for diverse results
-    - Confidence scoring
+    - Relevance-based confidence, abstaining when nothing relevant is found
     - Patient data integration
+    - Per-stage tracing and Prometheus metrics for ask()
     """
     
-    def __init__(self, data_dir: str = "medical_data"):
+    def __init__(self, data_dir: str = "medical_data",
+                 persist_directory: str = "./chroma_db",
+                 embeddings: Optional[Embeddings] = None,
+                 llm: Optional[BaseLLM] = None,
+                 patient_manager: Optional[PatientManager] = None,
+                 slow_request_ms: Optional[float] = None,
+                 relevance_threshold: Optional[float] = None):
         """
         Initialize the Medical RAG system.
         
         Args:
             data_dir: Directory containing medical documents
+            persist_directory: Directory for the vector store
+            embeddings: Embedding model (defaults to all-MiniLM-L6-v2)
+            llm: Language model (defaults to TinyLlama, loaded on first use)
+            patient_manager: Patient records (defaults to ./patient_data)
+            slow_request_ms: Save a sampling profile of ask() calls slower than
+                this to profiles/ (defaults to $MEDICAL_RAG_SLOW_REQUEST_MS, off if unset)
+            relevance_threshold: Minimum cosine similarity of the best retrieved
+                chunk for ask() to generate an answer (defaults to
+                $MEDICAL_RAG_RELEVANCE_THRESHOLD, or 0.3)
         """
         self.data_dir = data_dir
-        self.embeddings = HuggingFaceEmbeddings(
+        self.persist_directory = persist_directory
+        self.embeddings = embeddings or HuggingFaceEmbeddings(
             model_name="sentence-transformers/all-MiniLM-L6-v2"
         )
-        self.vectorstore = None
         self.qa_chain = None
-        self.llm = None
-        self.patient_manager = PatientManager()
+        self.llm = llm
+        self.patient_manager = patient_manager or PatientManager()
+        self.corpus_store = CorpusStore(data_dir)
+        self.prompt = None
+        # Tune with retrieval_eval.py
+        self.chunk_size = 300
+        self.chunk_overlap = 100
+        self.search_kwargs = {"k": 5, "fetch_k": 10, "lambda_mult": 0.7}
+        
+        # Relevance (cosine similarity to the query) cut-offs for abstention and confidence
+        if relevance_threshold is None:
+            relevance_threshold = float(os.environ.get("MEDICAL_RAG_RELEVANCE_THRESHOLD", 0.3))
+        self.relevance_threshold = relevance_threshold
+        self.high_relevance = 0.5
+        
+        # Instrumentation
+        self.metrics = MetricsRegistry()
+        if slow_request_ms is None and os.environ.get("MEDICAL_RAG_SLOW_REQUEST_MS"):
+            slow_request_ms = float(os.environ["MEDICAL_RAG_SLOW_REQUEST_MS"])
+        self.slow_request_ms = slow_request_ms
+        self.profile_dir = "profiles"
+        
+        # Query embedding cache (repeated questions skip the embedding model)
+        self._query_cache = OrderedDict()
+        self._query_cache_size = 256
+        self._query_cache_lock = threading.Lock()
+        
+        # Blue/green index versions: rebuilds never block or disturb ask()
+        self._index = None
+        self._retired_indexes = []
+        self._index_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_thread = None
+        self._rebuild_pending = False
+        
+    @property
+    def vectorstore(self) -> Optional[Chroma]:
+        """The vector store of the live index version, or None before the first build."""
+        index = self._index
+        return index.vectorstore if index else None
+    
+    def _format_article(self, article: Dict[str, str]) -> str:
+        """
+        Format a collected article as a document string.
         
+        Args:
+            article: Article dictionary
+            
+        Returns:
+            Document string
+        """
+        text = f"Title: {article['title']}\n\n"
+        text += f"Abstract: {article['abstract']}\n\n"
+        text += f"Source: {article['source']}\n"
+        text += f"URL: {article['url']}"
+        return text
+    
+    def _create_text_splitter(self) -> RecursiveCharacterTextSplitter:
+        """Create the text splitter used for all indexed documents."""
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+    
     def load_documents(self) -> List[str]:
         """
         Load medical documents and patient data from various sources.
@@ -54,25 +282,77 @@ class MedicalRAG:
         Returns:
             List of document strings
         """
+        return [text for _, text in self._load_documents_with_ids()]
+    
+    def _article_id(self, article: Dict[str, str], position: int) -> str:
+        """
+        Get the document ID of a PubMed article.
+        
+        Records from the legacy pubmed_articles.json have no 'pmid' key;
+        the PMID is then taken from their source or URL.
+        
+        Args:
+            article: Article dictionary
+            position: Index of the article in its file, used if no PMID is found
+            
+        Returns:
+            pubmed-<pmid>, or legacy-<position> if the PMID is unknown
+        """
+        pmid = article.get('pmid')
+        if not pmid:
+            match = (LEGACY_PMID_PATTERN.search(article.get('source', ''))
+                     or LEGACY_PMID_PATTERN.search(article.get('url', '')))
+            if not match:
+                return f"legacy-{position}"
+            pmid = match.group(1)
+        return f"pubmed-{pmid}"
+    
+    def _load_documents_with_ids(self) -> List[Tuple[str, str]]:
+        """
+        Load documents with the ID prefix of their chunks in the index.
+        
+        PubMed articles use pubmed-<pmid>, the same IDs as
+        apply_corpus_changes(), so an article indexed by both is stored once.
+        
+        Returns:
+            List of (document ID, document string) pairs
+        """
         documents = []
         
-        # Load PubMed articles
+        # Load PubMed articles (legacy pubmed_articles.json if never collected incrementally)
         json_file = os.path.join(self.data_dir, "pubmed_articles.json")
-        if os.path.exists(json_file):
+        if self.corpus_store.exists():
+            articles = self.corpus_store.iter_articles()
+        elif os.path.exists(json_file):
             with open(json_file, 'r', encoding='utf-8') as f:
                 articles = json.load(f)
-                
-            for article in articles:
-                text = f"Title: {article['title']}\n\n"
-                text += f"Abstract: {article['abstract']}\n\n"
-                text += f"Source: {article['source']}\n"
-                text += f"URL: {article['url']}"
-                documents.append(text)
+        else:
+            articles = []
+        
+        seen = set()
+        for position, article in enumerate(articles):
+            doc_id = self._article_id(article, position)
+            if doc_id not in seen:
+                seen.add(doc_id)
+                documents.append((doc_id, self._format_article(article)))
+        
+        # Load MedlinePlus health topics
+        medlineplus_file = os.path.join(self.data_dir, "medlineplus_topics.json")
+        if os.path.exists(medlineplus_file):
+            with open(medlineplus_file, 'r', encoding='utf-8') as f:
+                topics = json.load(f)
+            
+            for topic in topics:
+                text = f"Title: {topic['title']}\n\n"
+                text += f"Summary: {topic['text']}\n\n"
+                text += f"Source: {topic['source']}\n"
+                text += f"URL: {topic['url']}"
+                documents.append((f"medlineplus-{len(documents)}", text))
         
         # Load patient data
         patient_summaries = self.patient_manager.get_all_patient_summaries()
         for summary in patient_summaries:
-            documents.append(f"PATIENT RECORD:\n{summary}")
+            documents.append((f"patient-{len(documents)}", f"PATIENT RECORD:\n{summary}"))
         
         return documents
     
@@ -84,31 +364,238 @@ class MedicalRAG:
         - Chunk size: 300 tokens (optimal for precise retrieval)
         - Overlap: 100 tokens (maintains context continuity)
         - Hierarchical separators for natural boundaries
+        
+        Each build goes into a new version directory under
+        persist_directory and is swapped in only once complete, so
+        concurrent ask() calls keep using the previous version meanwhile.
+        """
+        with self._rebuild_lock:
+            print("Loading documents...")
+            # Appends wait while locked, so every pending change read here
+            # is also in the store and this build includes it
+            with self.corpus_store.locked():
+                self.corpus_store.read_changes()
+                documents = self._load_documents_with_ids()
+            
+            if not documents:
+                raise ValueError("No documents found. Run data_collector.py first!")
+            
+            print(f"Loaded {len(documents)} documents")
+            
+            # Advanced chunking strategy
+            text_splitter = self._create_text_splitter()
+            texts, ids = [], []
+            for doc_id, document in documents:
+                chunks = text_splitter.create_documents([document])
+                texts.extend(chunks)
+                ids.extend(f"{doc_id}-{i}" for i in range(len(chunks)))
+            
+            name = f"v{time.strftime('%Y%m%d%H%M%S')}-{os.urandom(3).hex()}"
+            path = os.path.join(self.persist_directory, name)
+            in_use = self._claim_version(path)
+            print(f"Creating vector store {name} with {len(texts)} chunks...")
+            client = chromadb.PersistentClient(
+                path=path,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True,
+                    chroma_product_telemetry_impl="chroma_telemetry.NoTelemetry"
+                )
+            )
+            try:
+                vectorstore = Chroma.from_documents(
+                    documents=texts,
+                    embedding=self.embeddings,
+                    ids=ids,
+                    client=client
+                )
+            except Exception:
+                client.reset()
+                in_use.close()
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            
+            self._swap_index(IndexVersion(name, path, client, vectorstore, in_use))
+            self.corpus_store.clear_changes()
+            print("Vector store created!")
+    
+    def rebuild_index_async(self) -> None:
+        """
+        Rebuild the vector store in a background thread.
+        
+        Returns immediately; questions are answered from the current
+        index until the new one is swapped in. Calls made while a rebuild
+        is running are coalesced into a single follow-up rebuild.
+        """
+        with self._index_lock:
+            self._rebuild_pending = True
+            if self._rebuild_thread is not None:
+                return
+            self._rebuild_thread = threading.Thread(target=self._rebuild_worker, daemon=True)
+            self._rebuild_thread.start()
+    
+    def _rebuild_worker(self) -> None:
+        """Run rebuilds until no more are pending."""
+        while True:
+            with self._index_lock:
+                if not self._rebuild_pending:
+                    self._rebuild_thread = None
+                    return
+                self._rebuild_pending = False
+            try:
+                self.create_vectorstore()
+                self.metrics.increment("index_rebuilds")
+            except Exception:
+                self.metrics.increment("index_rebuild_failures")
+                logger.exception("Background index rebuild failed")
+    
+    def _swap_index(self, index: IndexVersion) -> None:
+        """
+        Make a completed index version live and retire the previous one.
+        
+        Args:
+            index: Newly built index version
         """
-        print("Loading documents...")
-        documents = self.load_documents()
+        with self._index_lock:
+            old, self._index = self._index, index
+            if self.qa_chain:
+                self.qa_chain.retriever = index.vectorstore.as_retriever(
+                    search_type="mmr",
+                    search_kwargs=self.search_kwargs
+                )
+            if old:
+                old.retired = True
+                self._retired_indexes.append(old)
+            # Versions still being read are kept; everything else is garbage
+            drop = [v for v in self._retired_indexes if v.readers == 0]
+            self._retired_indexes = [v for v in self._retired_indexes if v.readers > 0]
+        
+        for version in drop:
+            self._drop_index(version)
+        self._sweep_stale_versions()
+    
+    @contextmanager
+    def _versions_locked(self) -> Iterator[None]:
+        """Hold the lock that orders creating and sweeping version directories."""
+        with open(os.path.join(self.persist_directory, ".lock"), 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _claim_version(self, path: str) -> TextIO:
+        """
+        Create a version directory and mark it in use by this process.
         
-        if not documents:
-            raise ValueError("No documents found. Run data_collector.py first!")
+        Args:
+            path: Version directory
+            
+        Returns:
+            Open .in_use file; its shared lock is held until it is closed
+        """
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with self._versions_locked():
+            os.makedirs(path)
+            in_use = open(os.path.join(path, ".in_use"), 'a')
+            if fcntl:
+                fcntl.flock(in_use, fcntl.LOCK_SH)
+        return in_use
+    
+    def _sweep_stale_versions(self) -> None:
+        """
+        Delete version directories that no process is using.
         
-        print(f"Loaded {len(documents)} documents")
+        Covers versions left behind by processes that exited or crashed.
+        A version is in use while any process (including this one) holds
+        the shared lock on its .in_use file, so other app instances
+        sharing persist_directory keep their live index.
+        """
+        if not fcntl:
+            return
+        with self._versions_locked():
+            for name in os.listdir(self.persist_directory):
+                path = os.path.join(self.persist_directory, name)
+                in_use_file = os.path.join(path, ".in_use")
+                if not INDEX_VERSION_PATTERN.match(name) or not os.path.exists(in_use_file):
+                    continue
+                with open(in_use_file, 'a') as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    shutil.rmtree(path, ignore_errors=True)
+    
+    @contextmanager
+    def _use_index(self) -> Iterator[Chroma]:
+        """
+        Hold the live index version for the duration of a query.
         
-        # Advanced chunking strategy
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=300,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        texts = text_splitter.create_documents(documents)
+        Yields:
+            Vector store of the index version that was live on entry
+        """
+        with self._index_lock:
+            index = self._index
+            index.readers += 1
+        try:
+            yield index.vectorstore
+        finally:
+            with self._index_lock:
+                index.readers -= 1
+                drop = index.retired and index.readers == 0 and index in self._retired_indexes
+                if drop:
+                    self._retired_indexes.remove(index)
+            if drop:
+                self._drop_index(index)
+    
+    def _drop_index(self, index: IndexVersion) -> None:
+        """
+        Close a retired index version and delete its directory.
         
-        print(f"Creating vector store with {len(texts)} chunks...")
-        self.vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=self.embeddings,
-            persist_directory="./chroma_db"
-        )
+        Args:
+            index: Retired index version with no readers
+        """
+        # Chroma caches one client system per directory; reset it so its files are released
+        index.client.reset()
+        shutil.rmtree(index.path, ignore_errors=True)
+        index.in_use.close()
+    
+    def apply_corpus_changes(self) -> int:
+        """
+        Add articles collected since the last build to the vector store.
+        
+        Consumes the pending changes written by MedicalDataCollector,
+        so only new articles are embedded instead of rebuilding the index.
+        Chunk IDs are derived from the PMID, as in create_vectorstore(),
+        so re-applying or applying after a full build is harmless.
         
-        print("Vector store created!")
+        Returns:
+            Number of articles added
+        """
+        if not self.vectorstore:
+            # A full build indexes the pending articles along with everything else
+            pending = len(self.corpus_store.read_changes())
+            self.create_vectorstore()
+            return pending
+        
+        # Serialized with rebuilds, which consume the same pending changes
+        with self._rebuild_lock:
+            changes = self.corpus_store.read_changes()
+            if changes:
+                text_splitter = self._create_text_splitter()
+                chunks, ids = [], []
+                for article in changes:
+                    article_chunks = text_splitter.create_documents([self._format_article(article)])
+                    chunks.extend(article_chunks)
+                    ids.extend(f"pubmed-{article['pmid']}-{i}" for i in range(len(article_chunks)))
+                
+                print(f"Adding {len(changes)} new articles ({len(chunks)} chunks)...")
+                self.vectorstore.add_documents(chunks, ids=ids)
+            
+            self.corpus_store.clear_changes()
+        return len(changes)
     
     def load_local_llm(self) -> None:
         """
@@ -116,13 +603,16 @@ class MedicalRAG:
         
         Model: TinyLlama-1.1B-Chat-v1.0
         - Size: ~2GB
-        - Speed: ~2.4s per response
+        - Speed: ~2.4s per response (CPU; measure with benchmark.py --real-models)
         - Memory: ~2.2GB RAM
         
         Optimizations:
         - FP16 on GPU, FP32 on CPU
         - Low temperature (0.2) for factual answers
         - Repetition penalty to reduce redundancy
+        
+        max_new_tokens here is only the default; ask() sets a per-question
+        limit (see GENERATION_BUDGETS).
         """
         print("Loading local LLM (this may take a few minutes first time)...")
         
@@ -192,15 +682,12 @@ Instructions:
             template=prompt_template,
             input_variables=["context", "question"]
         )
+        self.prompt = PROMPT
         
         # Advanced retriever with MMR
         retriever = self.vectorstore.as_retriever(
             search_type="mmr",
-            search_kwargs={
-                "k": 5,
-                "fetch_k": 10,
-                "lambda_mult": 0.7
-            }
+            search_kwargs=self.search_kwargs
         )
         
         self.qa_chain = RetrievalQA.from_chain_type(
@@ -211,37 +698,232 @@ Instructions:
             return_source_documents=True
         )
     
-    def ask(self, question: str) -> Dict[str, Any]:
+    def ask(self, question: str,
+            cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         Ask a question and get an answer with sources and confidence.
         
+        Runs the same retrieval and prompt as qa_chain, one stage at a
+        time, so each stage can be timed. Timings and counters are added
+        to self.metrics and logged as JSON to the "medical_rag" logger.
+        If no retrieved chunk reaches relevance_threshold, the LLM is not
+        called and a "not found in the knowledge base" answer is returned.
+        
         Args:
             question: User's question
+            cancel_event: Set to stop generation early, e.g. when the
+                client that asked has gone away
             
         Returns:
             Dictionary containing:
             - answer: Generated response
             - sources: List of source documents
+            - scores: Relevance of each source to the question
             - confidence: Confidence score (High/Medium/Low)
+            - request_id: Identifier of the request in logs and profiles
         """
         if not self.qa_chain:
             self.setup_qa_chain()
         
-        # Query preprocessing
-        enhanced_question = self._enhance_query(question)
-        
-        # Get answer from chain
-        result = self.qa_chain({"query": enhanced_question})
+        trace = Trace()
+        with (SamplingProfiler() if self.slow_request_ms else nullcontext()) as profiler:
+            # Query preprocessing
+            with trace.span("enhance_query"):
+                enhanced_question = self._enhance_query(question)
+            
+            with trace.span("embed_query"):
+                query_embedding = self._embed_query(enhanced_question, trace)
+            
+            # A rebuild swapping in a new index does not affect this search
+            with trace.span("retrieve"), self._use_index() as vectorstore:
+                results = self._retrieve(vectorstore, query_embedding)
+            trace.count("retrieved_chunks", len(results))
+            source_docs = [doc for doc, _ in results]
+            scores = [score for _, score in results]
+            
+            if not scores or max(scores) < self.relevance_threshold:
+                # Nothing relevant was retrieved; skip generation entirely
+                trace.count("abstained")
+                answer = NOT_FOUND_ANSWER
+                source_docs, scores = [], []
+            else:
+                with trace.span("build_prompt"):
+                    prompt = self.prompt.format(
+                        context="\n\n".join(doc.page_content for doc in source_docs),
+                        question=enhanced_question
+                    )
+                
+                raw_answer = self._generate(prompt, trace,
+                                            self._generation_budget(enhanced_question),
+                                            cancel_event)
+                
+                # Post-process answer
+                with trace.span("clean_answer"):
+                    answer = self._clean_answer(raw_answer)
         
-        # Post-process answer
-        answer = self._clean_answer(result["result"])
+        trace.finish()
+        self._record_trace(trace, profiler)
         
         return {
             "answer": answer,
-            "sources": [doc.page_content[:200] + "..." for doc in result["source_documents"]],
-            "confidence": self._calculate_confidence(result["source_documents"])
+            "sources": [doc.page_content[:200] + "..." for doc in source_docs],
+            "scores": [round(score, 3) for score in scores],
+            "confidence": self._calculate_confidence(scores),
+            "request_id": trace.request_id
         }
     
+    def _retrieve(self, vectorstore: Chroma,
+                  query_embedding: List[float]) -> List[Tuple[Document, float]]:
+        """
+        MMR search that also returns each chunk's relevance to the query.
+        
+        Selects the same chunks as max_marginal_relevance_search_by_vector.
+        Relevance is the cosine similarity of the chunk to the query,
+        computed from the candidate embeddings already fetched for MMR.
+        
+        Args:
+            vectorstore: Index to search
+            query_embedding: Query embedding
+            
+        Returns:
+            List of (document, relevance) pairs, most similar first
+        """
+        results = vectorstore._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=self.search_kwargs.get("fetch_k", 20),
+            include=["metadatas", "documents", "embeddings"]
+        )
+        candidates = results["embeddings"][0]
+        if not candidates:
+            return []
+        
+        selected = maximal_marginal_relevance(
+            np.array(query_embedding, dtype=np.float32),
+            candidates,
+            k=self.search_kwargs.get("k", 4),
+            lambda_mult=self.search_kwargs.get("lambda_mult", 0.5)
+        )
+        scores = cosine_similarity([query_embedding], candidates)[0]
+        
+        # Candidates come back nearest first; keep that order
+        return [
+            (Document(page_content=results["documents"][0][i],
+                      metadata=results["metadatas"][0][i] or {}), float(scores[i]))
+            for i in sorted(selected)
+        ]
+    
+    def _embed_query(self, question: str, trace: Trace) -> List[float]:
+        """
+        Embed a query, reusing the embedding of a recently asked question.
+        
+        Args:
+            question: Enhanced question
+            trace: Request trace for cache hit/miss counts
+            
+        Returns:
+            Query embedding
+        """
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(question)
+            if embedding is not None:
+                self._query_cache.move_to_end(question)
+        
+        if embedding is not None:
+            trace.count("query_cache_hits")
+            return embedding
+        
+        trace.count("query_cache_misses")
+        embedding = self.embeddings.embed_query(question)
+        with self._query_cache_lock:
+            self._query_cache[question] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
+    
+    def _generation_budget(self, question: str) -> int:
+        """
+        Choose how many new tokens an answer to the question needs.
+        
+        Args:
+            question: Enhanced question
+            
+        Returns:
+            Soft token budget from GENERATION_BUDGETS
+        """
+        question = question.lower()
+        for pattern, budget in GENERATION_BUDGETS:
+            if pattern.search(question):
+                return budget
+        return DEFAULT_GENERATION_BUDGET
+    
+    def _generate(self, prompt: str, trace: Trace, budget: int = DEFAULT_GENERATION_BUDGET,
+                  cancel_event: Optional[threading.Event] = None) -> str:
+        """
+        Generate an answer, timing prefill and decoding when possible.
+        
+        For the local Hugging Face pipeline, prefill (prompt processing up
+        to the first token) and decoding are timed separately and tokens
+        counted. Decoding is capped at budget + GENERATION_GRACE_TOKENS
+        and ended early by AnswerStoppingCriteria. Other LLMs are timed
+        as a single "generate" stage and only honor cancellation before
+        they start.
+        
+        Args:
+            prompt: Full prompt
+            trace: Request trace
+            budget: Soft limit on new tokens
+            cancel_event: Stop generating once this is set
+            
+        Returns:
+            Generated text
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            trace.count("cancelled")
+            return ""
+        
+        pipe = getattr(self.llm, "pipeline", None)
+        if pipe is None or pipe.task != "text-generation":
+            with trace.span("generate"):
+                return self.llm(prompt)
+        
+        timer = GenerationTimer()
+        stopper = AnswerStoppingCriteria(pipe.tokenizer, budget, cancel_event)
+        start = time.perf_counter()
+        output = pipe(prompt, return_full_text=False,
+                      max_new_tokens=budget + GENERATION_GRACE_TOKENS,
+                      stopping_criteria=StoppingCriteriaList([timer, stopper]))
+        end = time.perf_counter()
+        
+        if stopper.reason == "cancelled":
+            trace.count("cancelled")
+        elif stopper.reason:
+            trace.count(f"stopped_{stopper.reason}")
+        
+        first_token_at = timer.first_token_at or end
+        trace.record("prefill", first_token_at - start)
+        trace.record("decode", end - first_token_at)
+        trace.count("tokens_in", timer.prompt_tokens)
+        trace.count("tokens_out", timer.new_tokens)
+        return output[0]["generated_text"]
+    
+    def _record_trace(self, trace: Trace, profiler: Optional[SamplingProfiler]) -> None:
+        """
+        Publish a finished trace to metrics and logs, profiling it if slow.
+        
+        Args:
+            trace: Finished request trace
+            profiler: Sampling profiler that ran during the request, if enabled
+        """
+        if profiler and trace.duration * 1000 >= self.slow_request_ms:
+            trace.count("slow_requests")
+            path = os.path.join(self.profile_dir, f"{trace.request_id}.folded")
+            profiler.save(path)
+            logger.warning(f"Slow request {trace.request_id} took "
+                           f"{trace.duration * 1000:.0f} ms; profile saved to {path}")
+        
+        self.metrics.observe(trace)
+        log_trace(trace)
+    
     def _enhance_query(self, question: str) -> str:
         """
         Enhance query for better retrieval.
@@ -292,23 +974,26 @@ Instructions:
         
         return answer.strip()
     
-    def _calculate_confidence(self, source_docs: List) -> str:
+    def _calculate_confidence(self, scores: List[float]) -> str:
         """
-        Calculate confidence score based on retrieved sources.
+        Calculate confidence score from the relevance of retrieved sources.
+        
+        High needs a strongly relevant best match backed by several
+        relevant sources; Medium needs at least two relevant sources.
         
         Args:
-            source_docs: List of retrieved documents
+            scores: Relevance of each retrieved source to the question
             
         Returns:
             Confidence level: "High", "Medium", or "Low"
         """
-        if not source_docs:
+        if not scores:
             return "Low"
         
-        # Heuristic: more sources = higher confidence
-        if len(source_docs) >= 3:
+        relevant = sum(score >= self.relevance_threshold for score in scores)
+        if max(scores) >= self.high_relevance and relevant >= 3:
             return "High"
-        elif len(source_docs) >= 2:
+        elif relevant >= 2:
             return "Medium"
         else:
             return "Low"
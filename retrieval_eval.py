@@ -0,0 +1,347 @@
+"""
+Retrieval Parameter Sweep
+
+Evaluates chunking and retrieval settings against a labeled set of
+questions and the documents relevant to them. For each configuration
+reports recall@k, MRR, the rate at which MedicalRAG would abstain at its
+relevance threshold, index size and retrieval latency, and marks the
+configurations on the recall/latency frontier.
+
+Embeddings are cached on disk between runs, so re-running a sweep (or
+adding configurations) only embeds chunks that have not been seen.
+
+Labels file (JSONL), one question per line. Relevant documents are
+PMIDs, MedlinePlus URLs or patient IDs:
+    {"question": "What is HbA1c?", "relevant": ["38012345", "P001"]}
+    
+Usage:
+    python3 retrieval_eval.py --labels eval_questions.jsonl
+    python3 retrieval_eval.py --synthetic 300 --stub-embeddings
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Any, Optional, Tuple
+
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.vectorstores import Chroma
+
+from benchmark import create_workspace
+from patient_manager import PatientManager
+from rag_system import MedicalRAG
+from stub_models import HashingEmbeddings, StubLLM
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def document_id(text: str) -> str:
+    """
+    Get the ID labels use for a document produced by load_documents().
+    
+    Args:
+        text: Document text
+        
+    Returns:
+        PMID for PubMed articles, patient ID for patient records,
+        otherwise the document URL
+    """
+    for pattern in (r"^Source: PubMed ID: (\S+)$", r"^Patient ID: (\S+)$", r"^URL: (\S+)$"):
+        match = re.search(pattern, text, re.MULTILINE)
+        if match:
+            return match.group(1)
+    return ""
+
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    """
+    Load labeled questions from a JSONL file.
+    
+    Args:
+        path: Labels file
+        
+    Returns:
+        List of {"question", "relevant"} dictionaries
+    """
+    labels = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                labels.append({"question": item["question"], "relevant": set(item["relevant"])})
+    return labels
+
+def synthetic_labels(data_dir: str, count: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Create labeled questions for a synthetic benchmark corpus.
+    
+    Each question names an intervention, outcome and condition; the
+    relevant documents are all articles studying that combination.
+    
+    Args:
+        data_dir: Medical data directory of a benchmark workspace
+        count: Number of questions
+        seed: Random seed
+        
+    Returns:
+        List of {"question", "relevant"} dictionaries
+    """
+    studies = {}
+    with open(os.path.join(data_dir, "pubmed_articles.jsonl"), 'r', encoding='utf-8') as f:
+        for line in f:
+            article = json.loads(line)
+            match = re.match(r"(.+) and (.+) in (.+): ", article['title'])
+            studies.setdefault(match.groups(), set()).add(article['pmid'])
+    
+    rng = random.Random(seed)
+    keys = sorted(studies)
+    labels = []
+    for intervention, outcome, condition in rng.sample(keys, min(count, len(keys))):
+        labels.append({
+            "question": f"Does {intervention.lower()} improve {outcome} in {condition}?",
+            "relevant": studies[(intervention, outcome, condition)]
+        })
+    return labels
+
+def parse_grid(value: str, cast) -> List:
+    """Parse a comma-separated list of parameter values."""
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+def build_index(rag: MedicalRAG, documents: List[str]) -> Tuple[Chroma, Dict[str, Any]]:
+    """
+    Chunk and embed documents with the rag's current chunking settings.
+    
+    Args:
+        rag: MedicalRAG whose chunk_size/chunk_overlap and embeddings to use
+        documents: Documents from load_documents()
+        
+    Returns:
+        Tuple of (in-memory vector store, index statistics)
+    """
+    texts = rag._create_text_splitter().create_documents(
+        documents, metadatas=[{"doc_id": document_id(doc)} for doc in documents]
+    )
+    
+    start = time.perf_counter()
+    vectorstore = Chroma.from_documents(
+        documents=texts,
+        embedding=rag.embeddings,
+        collection_name=f"eval-{uuid.uuid4().hex[:8]}"
+    )
+    build_s = time.perf_counter() - start
+    
+    dimensions = len(rag.embeddings.embed_query("dimension probe"))
+    text_bytes = sum(len(t.page_content.encode('utf-8')) for t in texts)
+    return vectorstore, {
+        "index_chunks": len(texts),
+        "index_mb": (len(texts) * dimensions * 4 + text_bytes) / 1e6,
+        "index_build_s": build_s
+    }
+
+def evaluate(rag: MedicalRAG, vectorstore: Chroma, labels: List[Dict[str, Any]],
+             query_embeddings: List[List[float]], search_type: str,
+             search_kwargs: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Measure retrieval quality and latency for one retrieval configuration.
+    
+    Retrieves through MedicalRAG._retrieve, as ask() does. Similarity
+    search is MMR with fetch_k=k and lambda_mult=1.0.
+    
+    Args:
+        rag: MedicalRAG whose retrieval and relevance_threshold to use
+        vectorstore: Index to search
+        labels: Labeled questions
+        query_embeddings: Embedding of each question
+        search_type: "mmr" or "similarity"
+        search_kwargs: k, and fetch_k/lambda_mult for MMR
+        
+    Returns:
+        Dictionary with recall_at_k, mrr, abstention_rate and latency in ms
+    """
+    if search_type == "mmr":
+        rag.search_kwargs = dict(search_kwargs)
+    else:
+        rag.search_kwargs = {"k": search_kwargs["k"], "fetch_k": search_kwargs["k"], "lambda_mult": 1.0}
+    
+    recalls, reciprocal_ranks, latencies = [], [], []
+    abstained = 0
+    for label, embedding in zip(labels, query_embeddings):
+        start = time.perf_counter()
+        results = rag._retrieve(vectorstore, embedding)
+        latencies.append(time.perf_counter() - start)
+        
+        if not results or max(score for _, score in results) < rag.relevance_threshold:
+            abstained += 1
+        retrieved = [doc.metadata.get("doc_id") for doc, _ in results]
+        relevant = label["relevant"]
+        recalls.append(len(relevant.intersection(retrieved)) / len(relevant))
+        rank = next((i for i, doc_id in enumerate(retrieved, 1) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    
+    latencies.sort()
+    return {
+        "recall_at_k": sum(recalls) / len(recalls),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "abstention_rate": abstained / len(labels),
+        "latency_ms_mean": sum(latencies) / len(latencies) * 1000,
+        "latency_ms_p95": latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)] * 1000
+    }
+
+def mark_frontier(results: List[Dict[str, Any]]) -> None:
+    """
+    Flag configurations that no other configuration beats on both
+    recall and latency.
+    
+    Args:
+        results: Sweep results, updated in place with "frontier"
+    """
+    for result in results:
+        result["frontier"] = not any(
+            other["recall_at_k"] >= result["recall_at_k"]
+            and other["latency_ms_mean"] <= result["latency_ms_mean"]
+            and (other["recall_at_k"] > result["recall_at_k"]
+                 or other["latency_ms_mean"] < result["latency_ms_mean"])
+            for other in results
+        )
+
+def run_sweep(rag: MedicalRAG, labels: List[Dict[str, Any]],
+              args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Evaluate every combination of the parameter grids.
+    
+    Each chunking configuration is indexed once and reused for all
+    retrieval configurations.
+    
+    Args:
+        rag: MedicalRAG providing documents, splitter and embeddings
+        labels: Labeled questions
+        args: Parsed command line arguments with the parameter grids
+        
+    Returns:
+        List of result dictionaries, one per configuration
+    """
+    documents = rag.load_documents()
+    query_embeddings = [rag.embeddings.embed_query(rag._enhance_query(label["question"]))
+                        for label in labels]
+    defaults = {"chunk_size": rag.chunk_size, "chunk_overlap": rag.chunk_overlap,
+                "search_type": "mmr", **rag.search_kwargs}
+    
+    retrieval_configs = []
+    for search_type in parse_grid(args.search_type, str):
+        for k in parse_grid(args.k, int):
+            if search_type == "similarity":
+                retrieval_configs.append((search_type, {"k": k}))
+                continue
+            for fetch_k, lambda_mult in itertools.product(parse_grid(args.fetch_k, int),
+                                                          parse_grid(args.lambda_mult, float)):
+                if fetch_k >= k:
+                    retrieval_configs.append((search_type, {"k": k, "fetch_k": fetch_k,
+                                                            "lambda_mult": lambda_mult}))
+    
+    results = []
+    for chunk_size, chunk_overlap in itertools.product(parse_grid(args.chunk_size, int),
+                                                       parse_grid(args.chunk_overlap, int)):
+        if chunk_overlap >= chunk_size:
+            continue
+        rag.chunk_size, rag.chunk_overlap = chunk_size, chunk_overlap
+        print(f"Indexing chunk_size={chunk_size} chunk_overlap={chunk_overlap}...")
+        vectorstore, index_stats = build_index(rag, documents)
+        
+        for search_type, search_kwargs in retrieval_configs:
+            config = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+                      "search_type": search_type, **search_kwargs}
+            results.append({
+                **config,
+                **index_stats,
+                **evaluate(rag, vectorstore, labels, query_embeddings, search_type, search_kwargs),
+                "current": config == defaults
+            })
+        vectorstore.delete_collection()
+    
+    mark_frontier(results)
+    return results
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    """Print results as a table, best recall first."""
+    header = (f"{'':2}{'size':>5} {'ovl':>4} {'type':>10} {'k':>3} {'fk':>3} {'lam':>4}"
+              f" {'recall@k':>9} {'MRR':>6} {'abst':>5} {'chunks':>7} {'MB':>6} {'ms':>7} {'p95ms':>7}")
+    print("\n" + header)
+    print("-" * len(header))
+    for r in sorted(results, key=lambda r: (-r["recall_at_k"], r["latency_ms_mean"])):
+        mark = ("*" if r["frontier"] else " ") + (">" if r["current"] else " ")
+        print(f"{mark}{r['chunk_size']:>5} {r['chunk_overlap']:>4} {r['search_type']:>10}"
+              f" {r['k']:>3} {r.get('fetch_k', '-'):>3} {r.get('lambda_mult', '-'):>4}"
+              f" {r['recall_at_k']:>9.3f} {r['mrr']:>6.3f} {r['abstention_rate']:>5.2f} {r['index_chunks']:>7}"
+              f" {r['index_mb']:>6.2f} {r['latency_ms_mean']:>7.2f} {r['latency_ms_p95']:>7.2f}")
+    print("\n* = on the recall/latency frontier, > = current MedicalRAG settings,"
+          " abst = share of questions below the relevance threshold")
+
+def main() -> None:
+    """Parse arguments and run the sweep."""
+    parser = argparse.ArgumentParser(description="Sweep chunking and retrieval parameters")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--labels", help="JSONL file of labeled questions")
+    source.add_argument("--synthetic", type=int, metavar="N",
+                        help="Generate a synthetic corpus with N labeled questions")
+    parser.add_argument("--data-dir", default="medical_data", help="Medical data directory")
+    parser.add_argument("--patient-dir", default="patient_data", help="Patient data directory")
+    parser.add_argument("--chunk-size", default="200,300,500")
+    parser.add_argument("--chunk-overlap", default="0,50,100")
+    parser.add_argument("--search-type", default="mmr,similarity")
+    parser.add_argument("--k", default="3,5,8")
+    parser.add_argument("--fetch-k", default="10,20")
+    parser.add_argument("--lambda-mult", default="0.5,0.7,1.0")
+    parser.add_argument("--relevance-threshold", type=float,
+                        help="Abstention threshold (default: MedicalRAG's)")
+    parser.add_argument("--stub-embeddings", action="store_true",
+                        help="Use deterministic hashing embeddings instead of MiniLM")
+    parser.add_argument("--cache-dir", default=".embedding_cache",
+                        help="On-disk cache of chunk embeddings")
+    parser.add_argument("--output", default="retrieval_eval_results.json")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    workdir: Optional[str] = None
+    data_dir, patient_dir = args.data_dir, args.patient_dir
+    if args.synthetic:
+        workdir = tempfile.mkdtemp(prefix="medical-rag-eval-")
+        create_workspace(workdir, max(200, args.synthetic * 2), 50, args.seed)
+        data_dir = os.path.join(workdir, "medical_data")
+        patient_dir = os.path.join(workdir, "patient_data")
+    
+    try:
+        if args.stub_embeddings:
+            underlying, namespace = HashingEmbeddings(), "hashing-384"
+        else:
+            underlying, namespace = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL
+        embeddings = CacheBackedEmbeddings.from_bytes_store(
+            underlying, LocalFileStore(args.cache_dir), namespace=namespace
+        )
+        
+        rag = MedicalRAG(data_dir=data_dir, embeddings=embeddings, llm=StubLLM(),
+                         patient_manager=PatientManager(patient_dir),
+                         relevance_threshold=args.relevance_threshold)
+        labels = (synthetic_labels(data_dir, args.synthetic, args.seed) if args.synthetic
+                  else load_labels(args.labels))
+        print(f"Evaluating {len(labels)} labeled questions...")
+        
+        results = run_sweep(rag, labels, args)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    print_results(results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Stub Models for Offline Testing
+
+Deterministic stand-ins for the embedding model and LLM, so the RAG
+pipeline can be benchmarked and evaluated without downloading models.
+"""
+
+import hashlib
+import math
+import re
+import time
+from typing import List, Optional, Any
+
+from langchain.embeddings.base import Embeddings
+from langchain.llms.base import LLM
+
+class HashingEmbeddings(Embeddings):
+    """
+    Bag-of-words embeddings using the hashing trick.
+    
+    Texts sharing words get similar vectors, so retrieval results are
+    meaningful enough for benchmarks, and identical across runs.
+    """
+    
+    def __init__(self, dimensions: int = 384):
+        """
+        Initialize hashing embeddings.
+        
+        Args:
+            dimensions: Vector size (384 matches all-MiniLM-L6-v2)
+        """
+        self.dimensions = dimensions
+    
+    def _embed(self, text: str) -> List[float]:
+        """Embed one text as a normalized signed word-count vector."""
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents."""
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query."""
+        return self._embed(text)
+
+class StubLLM(LLM):
+    """
+    LLM that answers instantly (or after a fixed delay) with a canned reply.
+    
+    The reply echoes the question, so answers differ per query but are
+    identical across runs.
+    """
+    
+    latency: float = 0.0
+    """Seconds to sleep per call, to simulate generation time."""
+    
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+    
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[Any] = None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        match = re.search(r"Question: (.*)", prompt)
+        question = match.group(1).strip() if match else "the question"
+        return (f"Based on the provided context, the answer to \"{question}\" "
+                f"is summarized in the retrieved sources.")